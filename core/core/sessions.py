@@ -0,0 +1,82 @@
+"""
+Сессии в межпроцессном кэше (SESSION_CACHE_ALIAS) вместо строки в django_session.
+
+С SESSION_DB_FALLBACK = True сессия дополнительно пишется в базу (write-through)
+и переживает очистку кэша; без него база сессиями не трогается вовсе.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends import cache, cached_db
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.utils import timezone
+
+
+CLEANUP_BATCH_SIZE = 1000
+
+
+class SessionFileCache(FileBasedCache):
+    """
+    Файловый кэш для сессий без вытеснения. Обычный FileBasedCache при каждой
+    записи обходит весь каталог (_cull) и при переполнении MAX_ENTRIES удаляет
+    случайную долю файлов - то есть живые сессии вместе с гостевыми корзинами.
+    Здесь сессия пропадает только по истечении срока: файл удаляет
+    clear_expired_sessions или первое чтение после срока.
+    """
+
+    def _cull(self):
+        pass
+
+
+def delete_expired_rows(batch_size=CLEANUP_BATCH_SIZE, pause=0):
+    # Удаляем пачками в отдельных коротких транзакциях, чтобы не держать
+    # блокировку SQLite на всё время очистки
+    deleted = 0
+    while True:
+        keys = list(
+            Session.objects.filter(expire_date__lt=timezone.now())
+            .values_list("session_key", flat=True)[:batch_size]
+        )
+        if not keys:
+            return deleted
+        deleted += Session.objects.filter(session_key__in=keys).delete()[0]
+        if pause:
+            time.sleep(pause)
+
+
+def purge_expired_cache_files(backend=None):
+    # Файловый кэш удаляет просроченный файл только при чтении или при
+    # переполнении; _is_expired() сам удаляет файл, если срок вышел
+    backend = backend or caches[settings.SESSION_CACHE_ALIAS]
+    if not isinstance(backend, FileBasedCache):
+        return 0
+    purged = 0
+    for filename in backend._list_cache_files():
+        try:
+            with open(filename, "rb") as f:
+                purged += backend._is_expired(f)
+        except FileNotFoundError:
+            pass
+    return purged
+
+
+class CacheSessionStore(cache.SessionStore):
+    cache_key_prefix = "core.sessions.cache"
+
+    @classmethod
+    def clear_expired(cls):
+        purge_expired_cache_files()
+
+
+class CachedDBSessionStore(cached_db.SessionStore):
+    cache_key_prefix = "core.sessions.cached_db"
+
+    @classmethod
+    def clear_expired(cls):
+        delete_expired_rows()
+        purge_expired_cache_files()
+
+
+SessionStore = CachedDBSessionStore if settings.SESSION_DB_FALLBACK else CacheSessionStore
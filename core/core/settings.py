@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -48,19 +50,30 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'store.replica.primary_pin_middleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.timing.ServerTimingMiddleware',
 ]
 
+# Заголовок Server-Timing и лог медленных запросов (core.timing).
+# Выключено - middleware не подключается и шаблоны рендерятся без замеров
+REQUEST_TIMING = os.environ.get('REQUEST_TIMING') == '1'
+REQUEST_TIMING_SLOW_MS = 500  # запрос дольше - в лог
+REQUEST_TIMING_DUPLICATES = 3  # одинаковый SQL столько раз за запрос - в лог как N+1
+
 ROOT_URLCONF = 'core.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': (
+            'core.timing.TimedDjangoTemplates' if REQUEST_TIMING
+            else 'django.template.backends.django.DjangoTemplates'
+        ),
         'DIRS': [BASE_DIR / "templates"],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -83,9 +96,81 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # История миграций store с нуля не проходит (Product создают и 0001,
+        # и 0003), поэтому тестовая база строится по моделям
+        'TEST': {'MIGRATE': False},
     }
 }
 
+# Настроенный под параллельную нагрузку SQLite, включается SQLITE_TUNED=1.
+# WAL: читатели не ждут писателя; BEGIN IMMEDIATE берёт блокировку на запись
+# в начале транзакции, а не посреди неё, где ждать busy_timeout уже нельзя
+SQLITE_TUNED = os.environ.get('SQLITE_TUNED') == '1'
+SQLITE_TUNED_SETTINGS = {
+    'CONN_MAX_AGE': 600,
+    'CONN_HEALTH_CHECKS': True,
+    'OPTIONS': {
+        'transaction_mode': 'IMMEDIATE',
+        'init_command': ';'.join([
+            'PRAGMA journal_mode=WAL',
+            'PRAGMA synchronous=NORMAL',
+            'PRAGMA busy_timeout=5000',
+            'PRAGMA mmap_size=268435456',  # 256 МБ
+            'PRAGMA cache_size=-65536',  # 64 МБ
+            'PRAGMA temp_store=MEMORY',
+        ]),
+    },
+}
+
+if SQLITE_TUNED:
+    DATABASES['default'].update(SQLITE_TUNED_SETTINGS)
+
+# Реплика для чтения каталога и заказов. Для SQLite это второй файл,
+# который сам не обновляется: рядом с сервером должна работать
+# `manage.py sync_replica --loop N`, иначе после REPLICA_PIN_SECONDS
+# каталог, списки заказов и выгрузки читают копию сколь угодно давнюю.
+# N не больше REPLICA_PIN_SECONDS, чтобы пользователь видел свои записи.
+# Без SQLITE_REPLICA_PATH всё читается с основной базы.
+# В тестах реплика есть всегда: отдельный файл, который тесты сами
+# синхронизируют через sync_replica()
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+SQLITE_REPLICA_PATH = os.environ.get('SQLITE_REPLICA_PATH')
+if SQLITE_REPLICA_PATH or TESTING:
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': SQLITE_REPLICA_PATH or BASE_DIR / 'replica.sqlite3',
+        'TEST': {'NAME': BASE_DIR / 'test_replica.sqlite3'},
+    }
+
+DATABASE_READ_ALIAS = 'replica' if 'replica' in DATABASES else 'default'
+DATABASE_ROUTERS = ['store.replica.PrimaryReplicaRouter']
+REPLICA_PIN_SECONDS = 5  # сколько читать с основной базы после своей записи
+
+
+# Cache
+# Файловый кэш общий для всех воркеров: версия каталога и страницы видны всем процессам
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+    },
+    # Отдельный кэш для сессий, чтобы очистка кэша каталога не разлогинивала.
+    # SESSION_CACHE_DIR можно указать в /dev/shm - тогда файлы живут в памяти.
+    # Живые сессии не вытесняются, размер каталога держит по сроку сессий
+    # периодический запуск clear_expired_sessions
+    'sessions': {
+        'BACKEND': 'core.sessions.SessionFileCache',
+        'LOCATION': os.environ.get('SESSION_CACHE_DIR', BASE_DIR / 'cache' / 'sessions'),
+    },
+}
+
+# Сессии в кэше: чтение и запись сессии не блокируют SQLite.
+# SESSION_DB_FALLBACK = True дополнительно пишет их в базу (write-through)
+SESSION_ENGINE = 'core.sessions'
+SESSION_CACHE_ALIAS = 'sessions'
+SESSION_DB_FALLBACK = os.environ.get('SESSION_DB_FALLBACK') == '1'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -120,14 +205,43 @@ USE_TZ = True
 
 STATIC_URL = "/static/"
 STATICFILES_DIRS = [BASE_DIR / "static"]
+STATIC_ROOT = BASE_DIR / "staticfiles"  # сюда собирает collectstatic, отдаёт core.staticfiles
+
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "core.staticfiles.CompressedManifestStaticFilesStorage",
+    },
+}
 
 MEDIA_ROOT = BASE_DIR / 'media'  # папка на диске, куда будет сохранятся
 MEDIA_URL = '/media/'  # URL-адрес для доступа через веб
+SERVE_MEDIA = DEBUG  # отдавать медиа самим Django, если перед ним нет веб-сервера
+MEDIA_IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365  # для картинок с хэшем в имени
+
+BASKET_RESERVATION_MINUTES = 60  # сколько товар в корзине держится в резерве
+LOW_STOCK_THRESHOLD = 5  # товары с таким остатком и меньше показываются в панели администратора
 
 LOGIN_REDIRECT_URL = '/account/profile/'
 LOGOUT_REDIRECT_URL = '/'
 LOGIN_URL = '/account/login/'
 
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'timing': {'class': 'logging.StreamHandler', 'formatter': 'message'},
+    },
+    'loggers': {
+        'core.timing': {'handlers': ['timing'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,196 @@
+import gzip
+import json
+import mimetypes
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from wsgiref.util import FileWrapper
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+import brotli
+
+
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.mjs', '.map', '.svg', '.json', '.txt', '.html', '.xml', '.ico', '.ttf', '.otf'}
+MIN_COMPRESS_SIZE = 256
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+MAX_AGE = 60  # для файлов без хэша в имени
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def compress_gzip(data):
+    # mtime=0, чтобы повторный collectstatic давал те же байты
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def compress_brotli(data):
+    return brotli.compress(data, quality=11)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Манифест с хэшами в именах и заранее сжатые .gz/.br копии рядом с файлами.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        processed_names = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run=dry_run, **options):
+            if not isinstance(processed, Exception):
+                processed_names.add(name)
+                if hashed_name:
+                    processed_names.add(hashed_name)
+            yield name, hashed_name, processed
+
+        if dry_run:
+            return
+        for name in sorted(processed_names):
+            for compressed_name in self.compress(name):
+                yield name, compressed_name, True
+
+    def compress(self, name):
+        if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+            return
+        with self.open(name) as source:
+            data = source.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return
+
+        for suffix, compress in (('.gz', compress_gzip), ('.br', compress_brotli)):
+            compressed = compress(data)
+            # Сжатие почти ничего не дало - отдавать такую копию нет смысла
+            if len(compressed) >= len(data) * 0.95:
+                continue
+            target = self.path(name + suffix)
+            with open(target, 'wb') as output:
+                output.write(compressed)
+            yield name + suffix
+
+
+class StaticFile:
+    def __init__(self, path, stat, immutable):
+        self.path = path
+        self.size = stat.st_size
+        self.last_modified = formatdate(stat.st_mtime, usegmt=True)
+        self.mtime = int(stat.st_mtime)
+        self.etag = file_etag(stat)
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if self.content_type.startswith('text/') or self.content_type in ('application/javascript', 'application/json'):
+            self.content_type += '; charset=utf-8'
+        self.cache_control = (
+            f'public, max-age={IMMUTABLE_MAX_AGE}, immutable' if immutable else f'public, max-age={MAX_AGE}'
+        )
+        # Кодирование -> (путь, размер, ETag). У каждой копии свой ETag: байты
+        # разные, и кэш не должен подставить gzip-ответ клиенту без gzip
+        self.encodings = {}
+        for encoding, suffix in ENCODINGS:
+            if os.path.isfile(path + suffix):
+                compressed = os.stat(path + suffix)
+                self.encodings[encoding] = (path + suffix, compressed.st_size, file_etag(compressed, encoding))
+
+
+def file_etag(stat, encoding=None):
+    tag = f'{stat.st_mtime_ns:x}-{stat.st_size:x}'
+    return f'"{tag}-{encoding}"' if encoding else f'"{tag}"'
+
+
+def accepted_encodings(header):
+    accepted = set()
+    for part in header.split(','):
+        encoding, _, params = part.strip().partition(';')
+        params = params.replace(' ', '')
+        if params.startswith('q='):
+            try:
+                if float(params[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(encoding.strip().lower())
+    return accepted
+
+
+class StaticFilesApplication:
+    """
+    WSGI-обёртка, которая отдаёт собранные collectstatic файлы мимо Django.
+
+    Список файлов читается один раз при старте, поэтому после collectstatic
+    воркеры нужно перезапустить. Файлы из манифеста (с хэшем в имени) отдаются
+    с immutable-кэшем, сжатая копия выбирается по Accept-Encoding.
+    """
+
+    def __init__(self, application, root=None, prefix=None):
+        self.application = application
+        self.root = os.fspath(root or settings.STATIC_ROOT or '')
+        self.prefix = prefix or settings.STATIC_URL or ''
+        if not self.prefix.startswith('/'):
+            # STATIC_URL указывает на другой хост (CDN), здесь отдавать нечего
+            self.prefix = ''
+        self.files = self.scan() if self.root and self.prefix else {}
+
+    def manifest_names(self):
+        try:
+            with open(os.path.join(self.root, ManifestStaticFilesStorage.manifest_name)) as manifest:
+                return set(json.load(manifest).get('paths', {}).values())
+        except (OSError, ValueError):
+            return set()
+
+    def scan(self):
+        immutable = self.manifest_names()
+        suffixes = tuple(suffix for _, suffix in ENCODINGS)
+        files = {}
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith(suffixes):
+                    continue
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, self.root).replace(os.sep, '/')
+                files[self.prefix + name] = StaticFile(path, os.stat(path), name in immutable)
+        return files
+
+    def __call__(self, environ, start_response):
+        if environ['REQUEST_METHOD'] in ('GET', 'HEAD'):
+            static_file = self.files.get(environ.get('PATH_INFO', ''))
+            if static_file is not None:
+                return self.serve(static_file, environ, start_response)
+        return self.application(environ, start_response)
+
+    def not_modified(self, static_file, etag, environ):
+        if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is not None:
+            return etag in [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+        if_modified_since = environ.get('HTTP_IF_MODIFIED_SINCE')
+        if if_modified_since:
+            try:
+                return parsedate_to_datetime(if_modified_since).timestamp() >= static_file.mtime
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def serve(self, static_file, environ, start_response):
+        path, size, etag, content_encoding = static_file.path, static_file.size, static_file.etag, None
+        accepted = accepted_encodings(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        for encoding, _ in ENCODINGS:
+            if encoding in static_file.encodings and encoding in accepted:
+                path, size, etag = static_file.encodings[encoding]
+                content_encoding = encoding
+                break
+
+        headers = [
+            ('Cache-Control', static_file.cache_control),
+            ('ETag', etag),
+            ('Last-Modified', static_file.last_modified),
+        ]
+        if static_file.encodings:
+            headers.append(('Vary', 'Accept-Encoding'))
+
+        if self.not_modified(static_file, etag, environ):
+            start_response('304 Not Modified', headers)
+            return []
+
+        if content_encoding:
+            headers.append(('Content-Encoding', content_encoding))
+        headers += [('Content-Type', static_file.content_type), ('Content-Length', str(size))]
+        start_response('200 OK', headers)
+        if environ['REQUEST_METHOD'] == 'HEAD':
+            return []
+        file_wrapper = environ.get('wsgi.file_wrapper', FileWrapper)
+        return file_wrapper(open(path, 'rb'), 64 * 1024)
@@ -0,0 +1,179 @@
+"""
+Замеры запроса: число SQL-запросов, время SQL, шаблонов и view.
+
+Результат уходит в заголовок Server-Timing (виден во вкладке Network
+браузера), медленные запросы и повторяющиеся SQL (N+1) пишутся в лог
+core.timing одной JSON-строкой. Включается REQUEST_TIMING = True; без него
+middleware отключается при старте, а шаблоны рендерит обычный DjangoTemplates.
+"""
+import json
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+
+logger = logging.getLogger(__name__)
+
+# Замер текущего запроса. ContextVar копируется в потоки sync_to_async,
+# поэтому шаблоны, отрендеренные там, попадают в тот же замер
+_current_timer = ContextVar("request_timer", default=None)
+
+
+class RequestTimer:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = 0
+        self.queries = 0
+        self.sql_time = 0
+        self.template_time = 0
+        self.statements = Counter()
+        self._template_depth = 0
+
+    def stop(self):
+        self.total = time.perf_counter() - self.started
+
+    @property
+    def view_time(self):
+        # SQL входит и во view, и в шаблоны: ленивые QuerySet выполняются при рендере
+        return max(self.total - self.template_time, 0)
+
+    def duplicates(self, threshold):
+        return [
+            {"sql": sql, "count": count}
+            for sql, count in self.statements.most_common()
+            if count >= threshold
+        ]
+
+    def server_timing(self):
+        return ", ".join([
+            f'db;dur={self.sql_time * 1000:.1f};desc="{self.queries} SQL"',
+            f"view;dur={self.view_time * 1000:.1f}",
+            f"tpl;dur={self.template_time * 1000:.1f}",
+            f"total;dur={self.total * 1000:.1f}",
+        ])
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        timer = _current_timer.get()
+        if timer is None:
+            return super().render(context, request)
+        # Учитываем только внешний рендер: render_to_string внутри тега
+        # шаблона уже входит во время родителя
+        timer._template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timer._template_depth -= 1
+            if not timer._template_depth:
+                timer.template_time += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+def record_query(execute, sql, params, many, context):
+    timer = _current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    # Время считаем и для запросов, упавших с ошибкой
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timer.sql_time += time.perf_counter() - started
+        timer.queries += 1
+        timer.statements[sql] += 1
+
+
+def install_query_recorder():
+    # Соединения живут в потоке, где работает ORM, поэтому обёртку ставим
+    # один раз на каждое соединение, а запрос находит её через ContextVar
+    for alias in connections:
+        wrappers = connections[alias].execute_wrappers
+        if record_query not in wrappers:
+            wrappers.append(record_query)
+
+
+def view_name(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return None
+    return match.view_name or match._func_path
+
+
+class ServerTimingMiddleware:
+    """
+    Ставится последним в MIDDLEWARE, чтобы замер охватывал только view и
+    рендер ответа, а не остальные middleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_TIMING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        install_query_recorder()
+        timer = RequestTimer()
+        token = _current_timer.set(timer)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_timer.reset(token)
+        return self.finish(request, response, timer)
+
+    async def __acall__(self, request):
+        # Async ORM ходит в базу из потока sync_to_async(thread_sensitive=True)
+        await sync_to_async(install_query_recorder)()
+        timer = RequestTimer()
+        token = _current_timer.set(timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_timer.reset(token)
+        return self.finish(request, response, timer)
+
+    def finish(self, request, response, timer):
+        timer.stop()
+        response["Server-Timing"] = timer.server_timing()
+
+        slow = timer.total * 1000 >= settings.REQUEST_TIMING_SLOW_MS
+        duplicates = timer.duplicates(settings.REQUEST_TIMING_DUPLICATES)
+        if slow or duplicates:
+            logger.warning(json.dumps({
+                "event": "slow_request" if slow else "duplicate_queries",
+                "view": view_name(request),
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                "total_ms": round(timer.total * 1000, 1),
+                "view_ms": round(timer.view_time * 1000, 1),
+                "template_ms": round(timer.template_time * 1000, 1),
+                "sql_ms": round(timer.sql_time * 1000, 1),
+                "queries": timer.queries,
+                "duplicates": duplicates,
+            }, ensure_ascii=False))
+        return response
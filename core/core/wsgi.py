@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_wsgi_application()
+
+from core.staticfiles import StaticFilesApplication  # noqa: E402 - нужны загруженные настройки
+
+application = StaticFilesApplication(application)
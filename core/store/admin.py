@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Category, Product, Basket
+from .models import Category, Product, Basket, Order, OrderItem, DailySales
 
 
 @admin.register(Category)
@@ -18,3 +18,72 @@ class ProductAdmin(admin.ModelAdmin):
 @admin.register(Basket)
 class BasketAdmin(admin.ModelAdmin):
     list_display = ('user', 'product', 'quantity')
+
+
+class OrderTotalPriceFilter(admin.SimpleListFilter):
+    title = "сумма заказа"
+    parameter_name = "total_price"
+
+    ranges = {
+        "lt1000": (None, 1000),
+        "1000-10000": (1000, 10000),
+        "10000-100000": (10000, 100000),
+        "gte100000": (100000, None),
+    }
+
+    def lookups(self, request, model_admin):
+        return [
+            ("lt1000", "до 1 000 ₽"),
+            ("1000-10000", "1 000 – 10 000 ₽"),
+            ("10000-100000", "10 000 – 100 000 ₽"),
+            ("gte100000", "от 100 000 ₽"),
+        ]
+
+    def queryset(self, request, queryset):
+        if self.value() not in self.ranges:
+            return queryset
+        low, high = self.ranges[self.value()]
+        if low is not None:
+            queryset = queryset.filter(total_price__gte=low)
+        if high is not None:
+            queryset = queryset.filter(total_price__lt=high)
+        return queryset
+
+
+class OrderItemInline(admin.TabularInline):
+    model = OrderItem
+    extra = 0
+    raw_id_fields = ('product',)
+
+
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'status', 'items_count', 'total_price', 'created_at')
+    list_filter = ('status', OrderTotalPriceFilter)
+    list_select_related = ('user',)
+    readonly_fields = ['items_count', 'total_price']
+    inlines = [OrderItemInline]
+
+    # Правка заказа в админке обходит методы OrderQuerySet, поэтому вклад в
+    # сводку продаж убираем до сохранения и добавляем после сохранения позиций.
+    # POST формы админка и так выполняет в одной транзакции
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            DailySales.objects.record(Order.objects.filter(pk=obj.pk), sign=-1)
+        super().save_model(request, obj, form, change)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        DailySales.objects.record(Order.objects.filter(pk=form.instance.pk))
+
+    def delete_model(self, request, obj):
+        Order.objects.filter(pk=obj.pk).delete_with_sales()
+
+    def delete_queryset(self, request, queryset):
+        queryset.delete_with_sales()
+
+
+@admin.register(DailySales)
+class DailySalesAdmin(admin.ModelAdmin):
+    list_display = ('day', 'orders_count', 'confirmed_count', 'cancelled_count', 'items_count', 'revenue')
@@ -0,0 +1,82 @@
+from .models import Basket, Product
+
+
+class GuestBasket:
+    """
+    Корзина анонимного посетителя в сессии: {id товара: количество}.
+
+    Сессии лежат в кэше, поэтому пока гость только выбирает товары, база
+    не получает ни одной записи. Остаток резервируется уже при слиянии с
+    корзиной пользователя после входа или регистрации.
+    """
+
+    session_key = "guest_basket"
+
+    def __init__(self, session):
+        self.session = session
+
+    def quantities(self):
+        return {int(pk): quantity for pk, quantity in self.session.get(self.session_key, {}).items()}
+
+    async def aquantities(self):
+        data = await self.session.aget(self.session_key, {})
+        return {int(pk): quantity for pk, quantity in data.items()}
+
+    def _save(self, quantities):
+        # Ключи JSON-сессии - строки
+        self.session[self.session_key] = {str(pk): quantity for pk, quantity in quantities.items()}
+
+    def add(self, product_id):
+        quantities = self.quantities()
+        quantity = quantities.get(product_id, 0) + 1
+        # Проверяем наличие без резерва: только чтение
+        if not Product.objects.filter(pk=product_id, count_available__gte=quantity).exists():
+            return False
+        quantities[product_id] = quantity
+        self._save(quantities)
+        return True
+
+    def remove(self, product_id):
+        quantities = self.quantities()
+        if product_id not in quantities:
+            return False
+        if quantities[product_id] > 1:
+            quantities[product_id] -= 1
+        else:
+            del quantities[product_id]
+        self._save(quantities)
+        return True
+
+    def set_quantities(self, quantities):
+        # Как Basket.objects.set_quantities, но без резерва: количество
+        # только урезается до текущего наличия
+        products = Product.objects.in_bulk(list(quantities))
+        current = self.quantities()
+        result = {}
+        for product_id, product in products.items():
+            result[product_id] = min(quantities[product_id], product.count_available)
+            if result[product_id]:
+                current[product_id] = result[product_id]
+            else:
+                current.pop(product_id, None)
+        self._save(current)
+        return result, products
+
+    def items(self):
+        quantities = self.quantities()
+        products = Product.objects.in_bulk(list(quantities))
+        return [Basket(product=products[pk], quantity=quantity) for pk, quantity in quantities.items() if pk in products]
+
+    async def aitems(self):
+        # Несохранённые строки Basket, чтобы шаблон корзины работал как для пользователя
+        quantities = await self.aquantities()
+        products = [product async for product in Product.objects.filter(pk__in=quantities)]
+        return [Basket(product=product, quantity=quantities[product.pk]) for product in products]
+
+    def merge_into(self, user):
+        quantities = self.quantities()
+        if not quantities:
+            return 0
+        merged = Basket.objects.merge(user, quantities)
+        self.session.pop(self.session_key, None)
+        return merged
@@ -0,0 +1,154 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+
+CATALOG_VERSION_KEY = "store:catalog:version"
+CATALOG_PAGE_TIMEOUT = 60  # после этого страница считается устаревшей
+CATALOG_STALE_TIMEOUT = 600  # сколько ещё можно отдавать устаревшую копию
+CATALOG_LOCK_TIMEOUT = 30
+CATALOG_WAIT_TIMEOUT = 2
+CATALOG_WAIT_INTERVAL = 0.05
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # Версия по времени: после вытеснения ключа не совпадёт со старыми страницами
+        version = time.time_ns()
+        if not cache.add(CATALOG_VERSION_KEY, version, None):
+            version = cache.get(CATALOG_VERSION_KEY, version)
+    return version
+
+
+async def aget_catalog_version():
+    version = await cache.aget(CATALOG_VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        if not await cache.aadd(CATALOG_VERSION_KEY, version, None):
+            version = await cache.aget(CATALOG_VERSION_KEY, version)
+    return version
+
+
+def bump_catalog_version():
+    cache.set(CATALOG_VERSION_KEY, time.time_ns(), None)
+
+
+def catalog_page_key(params, version=None):
+    digest = hashlib.md5(json.dumps(params, sort_keys=True).encode()).hexdigest()
+    if version is None:
+        version = get_catalog_version()
+    return f"store:catalog:{version}:{digest}"
+
+
+def lock_path(key):
+    # У FileBasedCache add() - это has_key() и set(), между процессами не
+    # атомарно. Поэтому блокировка - файл рядом с кэшем, созданный с O_EXCL
+    directory = getattr(cache, "_dir", None)
+    if directory is None:
+        return None
+    return os.path.join(directory, hashlib.md5(key.encode()).hexdigest() + ".lock")
+
+
+def acquire_lock(key):
+    path = lock_path(key)
+    if path is None:
+        # Кэш в памяти процесса: add() атомарен
+        return cache.add(key, 1, CATALOG_LOCK_TIMEOUT)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    for _ in range(2):
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            pass
+        try:
+            if time.time() - os.path.getmtime(path) < CATALOG_LOCK_TIMEOUT:
+                return False
+            # Владелец упал, не сняв блокировку
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    return False
+
+
+def release_lock(key):
+    path = lock_path(key)
+    if path is None:
+        cache.delete(key)
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def get_or_build_catalog_page(params, build):
+    # Кэш с защитой от «набега»: страницу пересобирает только владелец
+    # блокировки, остальные получают устаревшую копию или ждут готовую
+    key = catalog_page_key(params)
+    entry = cache.get(key)
+    if entry is not None and entry[0] > time.time():
+        return entry[1]
+
+    lock_key = f"{key}:lock"
+    if acquire_lock(lock_key):
+        try:
+            content = build()
+            cache.set(
+                key,
+                (time.time() + CATALOG_PAGE_TIMEOUT, content),
+                CATALOG_PAGE_TIMEOUT + CATALOG_STALE_TIMEOUT,
+            )
+            return content
+        finally:
+            release_lock(lock_key)
+
+    if entry is not None:
+        return entry[1]
+
+    deadline = time.monotonic() + CATALOG_WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(CATALOG_WAIT_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[1]
+    return build()
+
+
+async def aget_or_build_catalog_page(params, build):
+    # То же, что get_or_build_catalog_page, но build - корутина,
+    # а ожидание не занимает поток
+    key = catalog_page_key(params, await aget_catalog_version())
+    entry = await cache.aget(key)
+    if entry is not None and entry[0] > time.time():
+        return entry[1]
+
+    lock_key = f"{key}:lock"
+    if await sync_to_async(acquire_lock)(lock_key):
+        try:
+            content = await build()
+            await cache.aset(
+                key,
+                (time.time() + CATALOG_PAGE_TIMEOUT, content),
+                CATALOG_PAGE_TIMEOUT + CATALOG_STALE_TIMEOUT,
+            )
+            return content
+        finally:
+            await sync_to_async(release_lock)(lock_key)
+
+    if entry is not None:
+        return entry[1]
+
+    deadline = time.monotonic() + CATALOG_WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(CATALOG_WAIT_INTERVAL)
+        entry = await cache.aget(key)
+        if entry is not None:
+            return entry[1]
+    return await build()
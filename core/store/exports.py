@@ -0,0 +1,112 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+import itertools
+
+from asgiref.sync import sync_to_async
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Order, OrderItem
+from .streams import encode_rows
+
+
+ORDER_FIELDS = [
+    "order_id", "created_at", "status", "username", "email",
+    "items_count", "total_price", "cancelled_reason",
+]
+ITEM_FIELDS = ["product_id", "product_title", "quantity", "price", "line_total"]
+
+EXPORT_CHUNK_SIZE = 2000  # заказов за одну выборку, позиции - вторым запросом на пачку
+STREAM_LINES = 500  # строк файла в одном куске ответа
+
+
+def parse_day(value, name):
+    if not value:
+        return None
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is None:
+        raise ValueError(f"{name}: ожидается дата ГГГГ-ММ-ДД, получено {value!r}")
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def export_queryset(status=None, date_from=None, date_to=None):
+    # Даты включительно, в часовом поясе сайта
+    if status and status not in Order.Status.values:
+        raise ValueError(f"status: неизвестный статус {status!r}")
+    orders = Order.objects.all()
+    if status:
+        orders = orders.filter(status=status)
+    start = parse_day(date_from, "date_from")
+    if start:
+        orders = orders.filter(created_at__gte=start)
+    end = parse_day(date_to, "date_to")
+    if end:
+        orders = orders.filter(created_at__lt=end + timedelta(days=1))
+    return orders
+
+
+def order_chunks(orders, chunk_size=EXPORT_CHUNK_SIZE):
+    # Пачки по первичному ключу (keyset): каждая - два коротких запроса без
+    # сортировки всей выборки. Первые байты уходят сразу даже на миллионе
+    # заказов, а между пачками SQLite не держит открытый курсор и блокировку,
+    # пока медленный клиент скачивает ответ
+    last_pk = 0
+    while True:
+        chunk = list(
+            orders.filter(pk__gt=last_pk).order_by("pk").values(
+                "created_at", "status", "items_count", "total_price", "cancelled_reason",
+                order_id=F("pk"), username=F("user__username"), email=F("user__email"),
+            )[:chunk_size]
+        )
+        if not chunk:
+            return
+        items = defaultdict(list)
+        lines = (
+            OrderItem.objects.filter(order__in=orders.filter(pk__gt=last_pk, pk__lte=chunk[-1]["order_id"]))
+            .order_by("pk")
+            .values("order_id", "product_id", "quantity", "price", product_title=F("product__title"))
+        )
+        for item in lines:
+            item["line_total"] = item["quantity"] * item["price"]
+            items[item.pop("order_id")].append(item)
+        last_pk = chunk[-1]["order_id"]
+        yield chunk, items
+
+
+def export_rows(orders, fmt, chunk_size=EXPORT_CHUNK_SIZE):
+    empty_item = dict.fromkeys(ITEM_FIELDS)
+    for chunk, items in order_chunks(orders, chunk_size):
+        for row in chunk:
+            order_items = items.get(row["order_id"], [])
+            if fmt == "jsonl":
+                yield {**row, "items": order_items}
+                continue
+            # В CSV одна строка на позицию; заказ без позиций - одна строка с пустыми полями
+            for item in order_items or [empty_item]:
+                yield {**row, **item}
+
+
+def export_orders(orders, fmt, chunk_size=EXPORT_CHUNK_SIZE):
+    fields = ORDER_FIELDS + ["items"] if fmt == "jsonl" else ORDER_FIELDS + ITEM_FIELDS
+    return encode_rows(export_rows(orders, fmt, chunk_size), fields, fmt)
+
+
+def stream_chunks(lines, size=STREAM_LINES):
+    # Склеиваем строки в куски: на каждую строку отдельная запись в сокет дороже
+    lines = iter(lines)
+    while chunk := "".join(itertools.islice(lines, size)):
+        yield chunk
+
+
+async def astream_chunks(lines, size=STREAM_LINES):
+    # Под ASGI StreamingHttpResponse читает синхронный итератор целиком в память,
+    # поэтому отдаём его кусками через sync_to_async: запросы каждой пачки
+    # идут в том же потоке, что и остальной ORM запроса
+    chunks = stream_chunks(lines, size)
+    next_chunk = sync_to_async(lambda: next(chunks, None))
+    while (chunk := await next_chunk()) is not None:
+        yield chunk
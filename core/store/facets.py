@@ -0,0 +1,110 @@
+from django.db.models import Count, F, Value
+
+from .registry import category_registry
+
+
+def parse_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class CatalogFilters:
+    range_lookups = {
+        'price_min': 'price__gte',
+        'price_max': 'price__lte',
+        'year_min': 'year_of_production__gte',
+        'year_max': 'year_of_production__lte',
+    }
+
+    def __init__(self, params, categories=None):
+        # categories можно передать заранее загруженными (например, через
+        # category_registry.aall() в асинхронном представлении)
+        self.categories = category_registry.all() if categories is None else categories
+
+        self.ranges = {}
+        for name in self.range_lookups:
+            value = parse_int(params.get(name))
+            if value is not None:
+                self.ranges[name] = value
+
+        self.countries = sorted({country for country in params.getlist('country') if country})
+
+        # category_slug — старый одиночный фильтр, сливаем его со списком категорий
+        slugs = set(params.getlist('category'))
+        slugs.add(params.get('category_slug', ''))
+        self.category_slugs = sorted(slug for slug in slugs if slug)
+        self.category_ids = [
+            category.id for category in self.categories if category.slug in self.category_slugs
+        ]
+
+    def params(self):
+        params = dict(self.ranges)
+        if self.countries:
+            params['country'] = self.countries
+        if self.category_slugs:
+            params['category'] = self.category_slugs
+        return params
+
+    def apply(self, queryset, exclude=None):
+        queryset = queryset.filter(**{
+            self.range_lookups[name]: value for name, value in self.ranges.items()
+        })
+        if self.countries and exclude != 'country':
+            queryset = queryset.filter(production_country__in=self.countries)
+        if self.category_slugs and exclude != 'category':
+            queryset = queryset.filter(category_id__in=self.category_ids)
+        return queryset
+
+    def facet_queryset(self, queryset):
+        # Счётчики каждого фасета учитывают все фильтры, кроме собственного;
+        # оба GROUP BY уходят в базу одним запросом через UNION ALL
+        countries = (
+            self.apply(queryset, exclude='country')
+            .exclude(production_country='')
+            .order_by()
+            .annotate(facet=Value('country'), value=F('production_country'))
+            .values('facet', 'value')
+            .annotate(count=Count('id'))
+        )
+        categories = (
+            self.apply(queryset, exclude='category')
+            .order_by()
+            .annotate(facet=Value('category'), value=F('category_id'))
+            .values('facet', 'value')
+            .annotate(count=Count('id'))
+        )
+
+        return countries.union(categories, all=True)
+
+    def facet_counts(self, queryset):
+        return self.build_facets(self.facet_queryset(queryset))
+
+    async def afacet_counts(self, queryset):
+        return self.build_facets([row async for row in self.facet_queryset(queryset)])
+
+    def build_facets(self, rows):
+        counts = {'country': {}, 'category': {}}
+        for row in rows:
+            counts[row['facet']][row['value']] = row['count']
+
+        country_facets = [
+            {'value': value, 'count': count, 'selected': value in self.countries}
+            for value, count in sorted(counts['country'].items(), key=lambda item: (-item[1], item[0]))
+        ]
+        country_facets += [
+            {'value': value, 'count': 0, 'selected': True}
+            for value in self.countries
+            if value not in counts['country']
+        ]
+        category_facets = [
+            {
+                'category': category,
+                'count': counts['category'].get(category.id, 0),
+                'selected': category.slug in self.category_slugs,
+            }
+            for category in self.categories
+        ]
+        category_facets = [facet for facet in category_facets if facet['count'] or facet['selected']]
+        return country_facets, category_facets
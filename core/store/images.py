@@ -0,0 +1,75 @@
+import io
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+
+VARIANT_WIDTHS = (320, 640, 1024)
+VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def variant_name(name, width, ext):
+    root, _ = os.path.splitext(name)
+    return f"{root}_{width}w.{ext}"
+
+
+def variant_names(name):
+    return [
+        variant_name(name, width, ext)
+        for width in VARIANT_WIDTHS
+        for ext in VARIANT_FORMATS
+    ]
+
+
+def has_variants(name, storage=default_storage):
+    return all(storage.exists(target) for target in variant_names(name))
+
+
+def srcset(name, ext, storage=default_storage):
+    return ", ".join(
+        f"{storage.url(variant_name(name, width, ext))} {width}w"
+        for width in VARIANT_WIDTHS
+    )
+
+
+def to_rgb(image):
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def generate_variants(name, storage=default_storage):
+    # Поворачиваем по EXIF и пересохраняем без метаданных;
+    # картинки меньше нужной ширины не увеличиваем
+    with storage.open(name, 'rb') as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image = to_rgb(image)
+
+    for width in VARIANT_WIDTHS:
+        resized = image
+        if image.width > width:
+            height = round(image.height * width / image.width)
+            resized = image.resize((width, height), Image.Resampling.LANCZOS)
+
+        for ext, (image_format, options) in VARIANT_FORMATS.items():
+            buffer = io.BytesIO()
+            resized.save(buffer, image_format, **options)
+            target = variant_name(name, width, ext)
+            if storage.exists(target):
+                storage.delete(target)
+            storage.save(target, ContentFile(buffer.getvalue()))
+    return name
+
+
+def delete_variants(name, storage=default_storage):
+    for target in variant_names(name):
+        if storage.exists(target):
+            storage.delete(target)
@@ -0,0 +1,139 @@
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from wsgiref.util import setup_testing_defaults
+import asyncio
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.benchmarks import summarize
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает RPS и задержки WSGI (core.wsgi) и ASGI (core.asgi) при параллельной нагрузке. "
+        "Запросы идут прямо в приложение, без сети, поэтому сравниваются сами точки входа"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", action="append", dest="paths", help="URL для нагрузки, можно несколько раз")
+        parser.add_argument("--requests", type=int, default=500, help="запросов на каждый URL")
+        parser.add_argument("--concurrency", type=int, default=16)
+        parser.add_argument("--warmup", type=int, default=10)
+        parser.add_argument("--json", action="store_true", help="вывести результат в JSON")
+
+    def default_paths(self):
+        paths = ["/", "/catalog/", "/catalog/?filter_by=price", "/basket/"]
+        product_id = Product.objects.order_by("pk").values_list("pk", flat=True).first()
+        if product_id is not None:
+            paths.append(f"/detail/{product_id}/")
+        return paths
+
+    def handle(self, *args, **options):
+        from core.asgi import application as asgi_application
+        from core.wsgi import application as wsgi_application
+
+        if options["requests"] < 1 or options["concurrency"] < 1:
+            raise CommandError("--requests и --concurrency должны быть больше нуля")
+
+        entrypoints = (
+            ("wsgi", self.run_wsgi, wsgi_application),
+            ("asgi", self.run_asgi, asgi_application),
+        )
+        results = []
+        for path in options["paths"] or self.default_paths():
+            for name, run, application in entrypoints:
+                if options["warmup"]:
+                    run(path, application, options["warmup"], options["concurrency"])
+                stats = run(path, application, options["requests"], options["concurrency"])
+                results.append({"entrypoint": name, "path": path, **stats})
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, ensure_ascii=False, indent=2))
+            return
+        self.stdout.write(f"{'':5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'ошибок':>7}  путь")
+        for row in results:
+            self.stdout.write(
+                f"{row['entrypoint']:5} {row['rps']:8} {row['p50_ms']:8} {row['p95_ms']:8} "
+                f"{row['p99_ms']:8} {row['errors']:7}  {row['path']}"
+            )
+
+    def run_wsgi(self, path, application, count, concurrency):
+        url = urlsplit(path)
+
+        def request(_):
+            environ = {
+                "REQUEST_METHOD": "GET",
+                "PATH_INFO": url.path,
+                "QUERY_STRING": url.query,
+                "HTTP_HOST": "localhost",
+            }
+            setup_testing_defaults(environ)
+            status = []
+            started = time.perf_counter()
+            body = application(environ, lambda code, headers, exc_info=None: status.append(code))
+            try:
+                for _ in body:
+                    pass
+            finally:
+                if hasattr(body, "close"):
+                    body.close()
+            return time.perf_counter() - started, status[0].startswith("200")
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            responses = list(pool.map(request, range(count)))
+        elapsed = time.perf_counter() - started
+        return summarize([latency for latency, _ in responses], sum(not ok for _, ok in responses), elapsed)
+
+    def run_asgi(self, path, application, count, concurrency):
+        url = urlsplit(path)
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": url.path,
+            "raw_path": url.path.encode(),
+            "query_string": url.query.encode(),
+            "root_path": "",
+            "headers": [(b"host", b"localhost")],
+            "client": ("127.0.0.1", 50000),
+            "server": ("localhost", 80),
+        }
+
+        async def request(semaphore):
+            async with semaphore:
+                done = asyncio.Event()
+                status = []
+                requested = []
+
+                async def receive():
+                    if not requested:
+                        requested.append(True)
+                        return {"type": "http.request", "body": b"", "more_body": False}
+                    # Отключение только после ответа, иначе Django отменит запрос
+                    await done.wait()
+                    return {"type": "http.disconnect"}
+
+                async def send(message):
+                    if message["type"] == "http.response.start":
+                        status.append(message["status"])
+                    elif not message.get("more_body"):
+                        done.set()
+
+                started = time.perf_counter()
+                await application(dict(scope), receive, send)
+                return time.perf_counter() - started, status[-1] == 200
+
+        async def main():
+            semaphore = asyncio.Semaphore(concurrency)
+            started = time.perf_counter()
+            responses = await asyncio.gather(*(request(semaphore) for _ in range(count)))
+            return responses, time.perf_counter() - started
+
+        responses, elapsed = asyncio.run(main())
+        return summarize([latency for latency, _ in responses], sum(not ok for _, ok in responses), elapsed)
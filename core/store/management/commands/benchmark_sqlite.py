@@ -0,0 +1,116 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import random
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connections
+
+from store.benchmarks import copy_sqlite_database, summarize
+from store.models import Basket, Order, Product
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает пропускную способность оформления заказов на SQLite с настройками "
+        "по умолчанию и с SQLITE_TUNED_SETTINGS. Работает на временной копии базы"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=8, help="параллельных покупателей")
+        parser.add_argument("--seconds", type=float, default=5)
+        parser.add_argument("--json", action="store_true", help="вывести результат в JSON")
+
+    def handle(self, *args, **options):
+        database = connections.settings["default"]
+        if database["ENGINE"] != "django.db.backends.sqlite3":
+            raise CommandError("Команда сравнивает только настройки SQLite")
+        if options["workers"] < 1:
+            raise CommandError("--workers должен быть больше нуля")
+
+        original = dict(database)
+        modes = (
+            ("default", {"CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": False, "OPTIONS": {}}),
+            ("tuned", settings.SQLITE_TUNED_SETTINGS),
+        )
+        results = []
+        with tempfile.TemporaryDirectory() as directory:
+            try:
+                for name, overrides in modes:
+                    path = os.path.join(directory, f"{name}.sqlite3")
+                    copy_sqlite_database(original["NAME"], path)
+                    self.configure(database, original, overrides, path)
+                    product_ids, user_ids = self.prepare(options["workers"])
+                    stats = self.run(product_ids, user_ids, options["seconds"])
+                    results.append({"mode": name, "workers": options["workers"], **stats})
+                    connections["default"].close()
+            finally:
+                self.configure(database, original, {}, original["NAME"])
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, ensure_ascii=False, indent=2))
+            return
+        self.stdout.write(f"{'':8} {'заказов/с':>10} {'p50':>8} {'p95':>8} {'p99':>8} {'ошибок':>7}")
+        for row in results:
+            self.stdout.write(
+                f"{row['mode']:8} {row['rps']:10} {row['p50_ms']:8} {row['p95_ms']:8} "
+                f"{row['p99_ms']:8} {row['errors']:7}"
+            )
+
+    def configure(self, database, original, overrides, path):
+        # Потоки создают соединения из connections.settings, поэтому меняем его на месте
+        connections["default"].close()
+        database.clear()
+        database.update(original)
+        database.update(overrides)
+        database["NAME"] = path
+
+    def prepare(self, workers):
+        product_ids = list(Product.objects.values_list("pk", flat=True))
+        if not product_ids:
+            raise CommandError("В базе нет товаров")
+        # Остатка хватит на весь прогон, заказы не упрутся в ноль
+        Product.objects.update(count_available=10 ** 6)
+        Basket.objects.all().delete()
+        users = CustomUser.objects.bulk_create([
+            CustomUser(username=f"benchmark-{time.time_ns()}-{i}", email=f"benchmark{i}@example.com")
+            for i in range(workers)
+        ])
+        user_ids = list(
+            CustomUser.objects.filter(username__in=[user.username for user in users]).values_list("pk", flat=True)
+        )
+        connections["default"].close()
+        return product_ids, user_ids
+
+    def run(self, product_ids, user_ids, seconds):
+        deadline = time.perf_counter() + seconds
+
+        def shop(user_id):
+            user = CustomUser(pk=user_id)
+            latencies, errors = [], 0
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    for product_id in random.sample(product_ids, min(2, len(product_ids))):
+                        Basket.objects.add_product(user, product_id)
+                    Order.objects.create_from_basket(user)
+                except OperationalError:
+                    errors += 1
+                else:
+                    latencies.append(time.perf_counter() - started)
+                finally:
+                    # Как в конце запроса: без CONN_MAX_AGE соединение закрывается
+                    close_old_connections()
+            connections["default"].close()
+            return latencies, errors
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(user_ids)) as pool:
+            shoppers = list(pool.map(shop, user_ids))
+        elapsed = time.perf_counter() - started
+        latencies = sorted(latency for shopper, _ in shoppers for latency in shopper)
+        return summarize(latencies, sum(errors for _, errors in shoppers), elapsed)
@@ -0,0 +1,203 @@
+from contextlib import ExitStack
+import itertools
+import json
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from store.benchmarks import copy_sqlite_database, summarize
+from store.cache import bump_catalog_version
+from store.models import Product
+from store.views import StoreCatalogView
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        "Гоняет основные сценарии магазина через тестовый клиент и выводит в JSON "
+        "p50/p95/p99, запросы к базе на запрос и RPS. С --baseline завершается ошибкой, "
+        "если результат хуже сохранённого. SQLite по умолчанию работает на временной копии базы"
+    )
+
+    password = "benchmark-password"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=50, help="запросов на каждый сценарий")
+        parser.add_argument("--warmup", type=int, default=3)
+        parser.add_argument("--flow", action="append", dest="flows", help="только этот сценарий, можно несколько раз")
+        parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+        parser.add_argument("--save-baseline", help="сохранить результат в этот файл")
+        parser.add_argument(
+            "--tolerance", type=float, default=0.2,
+            help="допустимое ухудшение p95 и RPS, доля (0.2 = 20%%)",
+        )
+        parser.add_argument("--in-place", action="store_true", help="работать на настоящей базе, а не на копии")
+
+    def handle(self, *args, **options):
+        if options["requests"] < 1:
+            raise CommandError("--requests должен быть больше нуля")
+        baseline = self.load_baseline(options["baseline"]) if options["baseline"] else None
+
+        database = connections.settings["default"]
+        copy = not options["in_place"] and database["ENGINE"] == "django.db.backends.sqlite3"
+        with tempfile.TemporaryDirectory() as directory:
+            original = database["NAME"]
+            if copy:
+                path = os.path.join(directory, "benchmark.sqlite3")
+                copy_sqlite_database(original, path)
+                self.use_database(database, path)
+            try:
+                # Страницы каталога с подменёнными остатками и сессии прогона
+                # не должны попасть в настоящий кэш, откуда их получат посетители
+                with override_settings(CACHES=self.isolated_caches(directory)):
+                    results = self.run(options)
+            finally:
+                if copy:
+                    self.use_database(database, original)
+        if not copy:
+            # prepare() поменял остатки в настоящей базе в обход сигналов
+            bump_catalog_version()
+
+        report = json.dumps({"flows": results}, ensure_ascii=False, indent=2)
+        self.stdout.write(report)
+        if options["save_baseline"]:
+            with open(options["save_baseline"], "w", encoding="utf-8") as f:
+                f.write(report)
+
+        if baseline is not None:
+            regressions = self.compare(results, baseline, options["tolerance"])
+            if regressions:
+                raise CommandError("Регрессия относительно базового прогона:\n" + "\n".join(regressions))
+            self.stderr.write(self.style.SUCCESS("Регрессий относительно базового прогона нет"))
+
+    def use_database(self, database, path):
+        connections["default"].close()
+        database["NAME"] = path
+
+    def isolated_caches(self, directory):
+        prefix = f"benchmark-{time.time_ns()}"
+        caches = {}
+        for alias, config in settings.CACHES.items():
+            config = dict(config, KEY_PREFIX=f"{prefix}:{config.get('KEY_PREFIX', '')}")
+            if config["BACKEND"].endswith("FileBasedCache"):
+                config["LOCATION"] = os.path.join(directory, "cache", alias)
+            caches[alias] = config
+        return caches
+
+    def load_baseline(self, path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)["flows"]
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f"Не удалось прочитать {path}: {e}")
+
+    def compare(self, results, baseline, tolerance):
+        regressions = []
+        for name, row in results.items():
+            base = baseline.get(name)
+            if base is None:
+                continue
+            # Ответы с ошибкой не попадают в задержки и запросы, поэтому
+            # сценарий, который начал падать, сравнивается по числу ошибок
+            if row["errors"] > base["errors"]:
+                regressions.append(f"{name}: ошибок {row['errors']}, было {base['errors']}")
+            if row["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+                regressions.append(f"{name}: p95 {row['p95_ms']} мс, было {base['p95_ms']} мс")
+            if row["rps"] < base["rps"] * (1 - tolerance):
+                regressions.append(f"{name}: RPS {row['rps']}, было {base['rps']}")
+            # Число запросов не зависит от шума машины, поэтому без допуска
+            if row["queries"] > base["queries"]:
+                regressions.append(f"{name}: запросов {row['queries']}, было {base['queries']}")
+        return regressions
+
+    def prepare(self):
+        product_ids = list(Product.objects.filter(count_available__gt=0).values_list("pk", flat=True)[:100])
+        if not product_ids:
+            raise CommandError("В базе нет товаров в наличии, сначала запустите seed_store")
+        # Остатка хватит на весь прогон
+        Product.objects.filter(pk__in=product_ids).update(count_available=10 ** 6)
+
+        suffix = time.time_ns()
+        shopper = CustomUser.objects.create_user(
+            username=f"benchmark-{suffix}", email=f"benchmark-{suffix}@example.com", password=self.password
+        )
+        staff = CustomUser.objects.create_user(
+            username=f"benchmark-staff-{suffix}", email=f"benchmark-staff-{suffix}@example.com", is_staff=True
+        )
+        # localhost разрешён в ALLOWED_HOSTS при DEBUG, testserver - только в тестах
+        client, staff_client = Client(HTTP_HOST="localhost"), Client(HTTP_HOST="localhost")
+        client.force_login(shopper)
+        staff_client.force_login(staff)
+        return client, staff_client, itertools.cycle(product_ids)
+
+    def get_flows(self, client, staff_client, products):
+        # Сценарий: (подготовка без замера, замеряемый запрос)
+        flows = {"homepage": (None, lambda: client.get("/"))}
+        for sort_by in StoreCatalogView.sort_fields:
+            catalog = lambda sort_by=sort_by: client.get("/catalog/", {"filter_by": sort_by})
+            # Тёплый запрос отдаётся из кэша страниц; для холодного версия каталога
+            # сбрасывается перед каждым замером, и страница собирается запросами к базе
+            flows[f"catalog_{sort_by}"] = (None, catalog)
+            flows[f"catalog_{sort_by}_cold"] = (bump_catalog_version, catalog)
+        flows.update({
+            "detail": (None, lambda: client.get(f"/detail/{next(products)}/")),
+            "basket_add": (None, lambda: client.get(f"/basket/add/{self.product_id}/")),
+            "basket_remove": (
+                lambda: client.get(f"/basket/add/{self.product_id}/"),
+                lambda: client.get(f"/basket/delete/{self.product_id}/"),
+            ),
+            "checkout": (
+                lambda: client.get(f"/basket/add/{self.product_id}/"),
+                lambda: client.post("/orders/checkout/", {"password": self.password}),
+            ),
+            "my_orders": (None, lambda: client.get("/orders/")),
+            "admin_orders": (None, lambda: staff_client.get("/admin/orders/")),
+        })
+        return flows
+
+    def run(self, options):
+        client, staff_client, products = self.prepare()
+        self.product_id = next(products)
+        flows = self.get_flows(client, staff_client, products)
+        unknown = set(options["flows"] or []) - set(flows)
+        if unknown:
+            raise CommandError(f"Неизвестные сценарии: {', '.join(sorted(unknown))}. Есть: {', '.join(flows)}")
+
+        results = {}
+        for name, (setup, request) in flows.items():
+            if options["flows"] and name not in options["flows"]:
+                continue
+            for _ in range(options["warmup"]):
+                if setup:
+                    setup()
+                request()
+            results[name] = self.measure(setup, request, options["requests"])
+        return results
+
+    def measure(self, setup, request, count):
+        latencies, queries, errors = [], 0, 0
+        elapsed = 0
+        for _ in range(count):
+            if setup:
+                setup()
+            with ExitStack() as stack:
+                captured = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+                started = time.perf_counter()
+                response = request()
+                latency = time.perf_counter() - started
+            elapsed += latency
+            if response.status_code >= 400:
+                errors += 1
+                continue
+            latencies.append(latency)
+            queries += sum(len(capture) for capture in captured)
+        latencies.sort()
+        stats = summarize(latencies, errors, elapsed)
+        stats["queries"] = round(queries / len(latencies), 1) if latencies else 0
+        return stats
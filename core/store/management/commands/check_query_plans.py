@@ -0,0 +1,86 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.http import QueryDict
+from django.utils import timezone
+
+from store.facets import CatalogFilters
+from store.models import Basket, DailyProductSales, Order, Product
+from store.pagination import KeysetPaginator, encode_cursor
+from store.views import StoreCatalogView
+
+
+class Command(BaseCommand):
+    help = "Проверяет, что горячие запросы магазина используют индексы из Meta.indexes"
+
+    # Поле сортировки каталога -> (индекс, пример значения для курсора)
+    catalog_indexes = {
+        "created_at": ("product_instock_created_idx", timezone.now()),
+        "year_of_production": ("product_instock_year_idx", 2020),
+        "title": ("product_instock_title_idx", "а"),
+        "price": ("product_instock_price_idx", 1000),
+    }
+
+    def get_checks(self):
+        catalog = StoreCatalogView.queryset
+        checks = []
+        for sort_by, ordering in StoreCatalogView.sort_fields.items():
+            paginator = KeysetPaginator(catalog, ordering, StoreCatalogView.paginate_by)
+            index, value = self.catalog_indexes[ordering.lstrip("-")]
+            cursor = encode_cursor("next", value, 1)
+            checks.append((f"catalog {sort_by}", paginator.page_queryset(), index))
+            checks.append((f"catalog {sort_by} (курсор)", paginator.page_queryset(cursor), index))
+
+        facets = CatalogFilters(QueryDict()).facet_queryset(catalog)
+        checks += [
+            ("фасет «страна»", facets, "product_instock_country_idx"),
+            ("фасет «категория»", facets, "product_instock_cat_idx"),
+            (
+                "catalog по категории",
+                KeysetPaginator(catalog.filter(category_id=1), "-created_at", 24).page_queryset(),
+                "product_instock_cat_idx",
+            ),
+            ("мои заказы", Order.objects.filter(user_id=1).order_by("-created_at"), "order_user_created_idx"),
+            ("заказы по статусу", Order.objects.filter(status=Order.Status.NEW).order_by("-created_at"), "order_status_created_idx"),
+            ("корзина", Basket.objects.filter(user_id=1).select_related("product"), "basket_user_added_idx"),
+            (
+                "истёкшие резервы",
+                Basket.objects.filter(reserved_until__lt=timezone.now()).order_by("reserved_until").values_list("pk", flat=True),
+                "basket_reserved_until_idx",
+            ),
+            (
+                "ссылки на картинку",
+                Product.objects.filter(image="products/00/00/0.jpg").order_by().values("pk")[:1],
+                "product_image_idx",
+            ),
+            (
+                "заканчивающиеся товары",
+                Product.objects.filter(count_available__lte=settings.LOW_STOCK_THRESHOLD).order_by("count_available", "pk")[:20],
+                "product_count_idx",
+            ),
+            (
+                # UniqueConstraint(day, product) SQLite создаёт как автоиндекс таблицы
+                "продажи товаров за период",
+                DailyProductSales.objects.filter(day__gte=timezone.localdate()).values("product_id"),
+                "sqlite_autoindex_store_dailyproductsales",
+            ),
+        ]
+        return checks
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("Проверка планов написана для SQLite")
+
+        failed = []
+        for name, queryset, index in self.get_checks():
+            plan = queryset.explain()
+            ok = index in plan and "USE TEMP B-TREE FOR ORDER BY" not in plan
+            if ok:
+                self.stdout.write(self.style.SUCCESS(f"OK    {name}: {index}"))
+            else:
+                failed.append(name)
+                self.stdout.write(self.style.ERROR(f"FAIL  {name}: ожидался {index}"))
+                self.stdout.write(plan)
+
+        if failed:
+            raise CommandError(f"Индексы не используются: {', '.join(failed)}")
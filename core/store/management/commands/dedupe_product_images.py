@@ -0,0 +1,66 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from store.cache import bump_catalog_version
+from store.images import delete_variants, has_variants
+from store.models import Product
+from store.storage import CONTENT_ADDRESSED_NAME_RE
+
+
+class Command(BaseCommand):
+    help = "Переносит картинки товаров, загруженные до хранения по хэшу, под имена по содержимому"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        storage = Product._meta.get_field("image").storage
+        products = Product.objects.exclude(image="").only("pk", "image", "has_image_variants").order_by("pk")
+
+        moved, saved_bytes, missing = 0, 0, 0
+        stale = set()
+        batch = []
+        for product in products.iterator(chunk_size=options["batch_size"]):
+            old_name = product.image.name
+            if CONTENT_ADDRESSED_NAME_RE.search(old_name):
+                continue
+            if not storage.exists(old_name):
+                missing += 1
+                self.stderr.write(f"товар #{product.pk}: нет файла {old_name}")
+                continue
+
+            with storage.open(old_name, "rb") as source:
+                existed = storage.exists(storage.hashed_name(old_name, source))
+                new_name = storage.save(old_name, source)
+            if existed:
+                saved_bytes += storage.size(old_name)
+
+            product.image.name = new_name
+            product.has_image_variants = has_variants(new_name)
+            batch.append(product)
+            stale.add(old_name)
+
+            if len(batch) >= options["batch_size"]:
+                moved += self.flush(batch)
+                batch = []
+        moved += self.flush(batch)
+        if moved:
+            # bulk_update не шлёт сигналов, а в кэше каталога старые адреса картинок
+            bump_catalog_version()
+
+        # Старые файлы удаляем только после того, как на них не осталось ссылок
+        for old_name in stale:
+            if not storage.is_referenced(old_name):
+                delete_variants(old_name)
+                default_storage.delete(old_name)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Перенесено: {moved}, сэкономлено {saved_bytes} байт, без файла: {missing}"
+        ))
+
+    def flush(self, batch):
+        if batch:
+            with transaction.atomic():
+                Product.objects.bulk_update(batch, ["image", "has_image_variants"])
+        return len(batch)
@@ -0,0 +1,57 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.exports import EXPORT_CHUNK_SIZE, export_orders, export_queryset, stream_chunks
+from store.models import Order
+from store.streams import FORMATS, detect_format
+
+
+class Command(BaseCommand):
+    help = (
+        "Выгружает заказы с позициями в CSV (строка на позицию) или JSONL (объект на заказ "
+        "со списком items) потоком, как /admin/orders/export/"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="файл для записи, - для stdout")
+        parser.add_argument("--format", choices=FORMATS, help="по умолчанию по расширению файла")
+        parser.add_argument("--status", choices=Order.Status.values)
+        parser.add_argument("--from", dest="date_from", help="с даты ГГГГ-ММ-ДД включительно")
+        parser.add_argument("--to", dest="date_to", help="по дату ГГГГ-ММ-ДД включительно")
+        parser.add_argument("--batch-size", type=int, default=EXPORT_CHUNK_SIZE, help="заказов за одну выборку")
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size должен быть больше нуля")
+        try:
+            if options["path"] == "-":
+                fmt = options["format"] or "jsonl"
+            else:
+                fmt = detect_format(options["path"], options["format"])
+            orders = export_queryset(options["status"], options["date_from"], options["date_to"])
+        except ValueError as e:
+            raise CommandError(e)
+
+        started = time.perf_counter()
+        self.lines = 0
+        output = sys.stdout if options["path"] == "-" else open(options["path"], "w", encoding="utf-8", newline="")
+        try:
+            for chunk in stream_chunks(self.counted(export_orders(orders, fmt, options["batch_size"]))):
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+        # В CSV первая строка - заголовок
+        rows = max(self.lines - 1, 0) if fmt == "csv" else self.lines
+        elapsed = time.perf_counter() - started
+        self.stderr.write(self.style.SUCCESS(
+            f"Выгружено строк: {rows} за {elapsed:.1f} с ({rows / elapsed if elapsed else 0:.0f} строк/с)"
+        ))
+
+    def counted(self, lines):
+        for line in lines:
+            self.lines += 1
+            yield line
@@ -0,0 +1,64 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F
+
+from store.models import Product
+from store.streams import FORMATS, detect_format, encode_rows
+
+
+# Те же колонки читает import_products
+PRODUCT_FIELDS = [
+    "id", "title", "model", "year_of_production", "production_country", "price",
+    "count_available", "category_slug", "category_title", "image",
+]
+
+
+class Command(BaseCommand):
+    help = "Выгружает товары в CSV или JSONL потоком, не загружая каталог в память"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="файл для записи, - для stdout")
+        parser.add_argument("--format", choices=FORMATS, help="по умолчанию по расширению файла")
+        parser.add_argument("--category", action="append", dest="categories", help="slug категории, можно несколько раз")
+        parser.add_argument("--batch-size", type=int, default=2000, help="строк за одну выборку из базы")
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size должен быть больше нуля")
+        if options["path"] == "-":
+            fmt = options["format"] or "jsonl"
+        else:
+            try:
+                fmt = detect_format(options["path"], options["format"])
+            except ValueError as e:
+                raise CommandError(e)
+
+        products = Product.objects.order_by("pk").values(
+            "id", "title", "model", "year_of_production", "production_country", "price",
+            "count_available", "image", category_slug=F("category__slug"), category_title=F("category__title"),
+        )
+        if options["categories"]:
+            products = products.filter(category__slug__in=options["categories"])
+
+        started = time.perf_counter()
+        self.rows = 0
+        output = sys.stdout if options["path"] == "-" else open(options["path"], "w", encoding="utf-8", newline="")
+        try:
+            for line in encode_rows(self.counted(products, options["batch_size"]), PRODUCT_FIELDS, fmt):
+                output.write(line)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+        elapsed = time.perf_counter() - started
+        self.stderr.write(self.style.SUCCESS(
+            f"Выгружено товаров: {self.rows} за {elapsed:.1f} с ({self.rows / elapsed if elapsed else 0:.0f} строк/с)"
+        ))
+
+    def counted(self, queryset, batch_size):
+        # iterator() читает курсором пачками по batch_size и не кэширует строки
+        for row in queryset.iterator(chunk_size=batch_size):
+            self.rows += 1
+            yield row
@@ -0,0 +1,44 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import os
+
+import django
+from django.core.management.base import BaseCommand
+
+from store.images import generate_variants
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = "Создаёт уменьшенные WebP/JPEG копии картинок товаров, у которых их ещё нет"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="пересоздать копии для всех товаров")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image="")
+        if not options["all"]:
+            products = products.filter(has_image_variants=False)
+        pending = list(products.order_by("pk").values_list("pk", "image"))
+
+        done, failed = 0, 0
+        with ProcessPoolExecutor(max_workers=options["workers"], initializer=django.setup) as pool:
+            for start in range(0, len(pending), options["batch_size"]):
+                batch = pending[start:start + options["batch_size"]]
+                futures = {pool.submit(generate_variants, name): pk for pk, name in batch}
+                ready = []
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                    except Exception as exc:
+                        failed += 1
+                        self.stderr.write(f"товар #{futures[future]}: {exc}")
+                    else:
+                        ready.append(futures[future])
+                # Флаг ставим одним UPDATE на пачку
+                Product.objects.filter(pk__in=ready).update(has_image_variants=True)
+                done += len(ready)
+                self.stdout.write(f"обработано {done} из {len(pending)}")
+
+        self.stdout.write(self.style.SUCCESS(f"Готово: {done}, ошибок: {failed}"))
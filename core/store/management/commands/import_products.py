@@ -0,0 +1,232 @@
+import os
+import time
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+
+from slugify import slugify
+
+from store.cache import bump_catalog_version
+from store.images import generate_variants, has_variants
+from store.models import Category, Product, product_image_path
+from store.registry import category_registry
+from store.search import index_category, index_products
+from store.streams import FORMATS, detect_format, read_rows
+from store.transactions import retry_on_locked
+
+
+# Поля, которые перезаписываются у существующего товара; created_at остаётся прежним
+UPDATE_FIELDS = [
+    "title", "model", "year_of_production", "production_country", "price",
+    "count_available", "category", "image", "has_image_variants",
+]
+
+
+def integer(row, name, minimum=None, required=False):
+    value = row.get(name)
+    if value is None or value == "":
+        if required:
+            raise ValueError(f"не заполнено поле {name}")
+        return None
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name}: ожидалось целое число, получено {value!r}")
+    if minimum is not None and value < minimum:
+        raise ValueError(f"{name}: значение меньше {minimum}")
+    return value
+
+
+def text(row, name, max_length=None, required=False):
+    value = str(row.get(name) or "").strip()
+    if required and not value:
+        raise ValueError(f"не заполнено поле {name}")
+    if max_length and len(value) > max_length:
+        raise ValueError(f"{name}: длиннее {max_length} символов")
+    return value
+
+
+class Command(BaseCommand):
+    help = (
+        "Загружает товары из CSV или JSONL потоком (формат как у export_products). "
+        "Строки с id обновляют товар, без id - создают новый; категории создаются или "
+        "переименовываются по slug"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=FORMATS, help="по умолчанию по расширению файла")
+        parser.add_argument("--batch-size", type=int, default=1000, help="товаров в одной транзакции")
+        parser.add_argument(
+            "--images-dir",
+            help="папка с картинками: файлы, которых ещё нет в хранилище, загружаются оттуда",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size должен быть больше нуля")
+        try:
+            fmt = detect_format(options["path"], options["format"])
+        except ValueError as e:
+            raise CommandError(e)
+
+        self.storage = Product._meta.get_field("image").storage
+        self.images_dir = options["images_dir"] and os.path.realpath(options["images_dir"])
+        # Имя из файла -> (имя в хранилище, есть ли копии). Одна картинка часто у многих товаров
+        self.images = {}
+        self.categories = {slug: (pk, title) for pk, slug, title in Category.objects.values_list("pk", "slug", "title")}
+        self.categories_changed = False
+
+        started = reported = time.perf_counter()
+        imported = errors = 0
+        batch = []
+        # utf-8-sig: Excel сохраняет CSV с BOM
+        with open(options["path"], encoding="utf-8-sig", newline="") as f:
+            rows = read_rows(f, fmt)
+            while True:
+                try:
+                    line_number, row = next(rows)
+                except StopIteration:
+                    break
+                except (ValueError, UnicodeDecodeError) as e:
+                    raise CommandError(f"{e}. Загружено до ошибки: {imported}")
+                try:
+                    batch.append((line_number, self.parse(row)))
+                except ValueError as e:
+                    errors += 1
+                    self.stderr.write(f"строка {line_number}: {e}")
+                if len(batch) >= options["batch_size"]:
+                    imported += self.flush(batch)
+                    batch = []
+                    if time.perf_counter() - reported >= 5:
+                        reported = time.perf_counter()
+                        self.stderr.write(f"загружено {imported}, {imported / (reported - started):.0f} строк/с")
+            imported += self.flush(batch)
+
+        if imported:
+            # bulk_create не шлёт сигналов: кэш каталога и реестр категорий сбрасываем сами
+            bump_catalog_version()
+        if self.categories_changed:
+            category_registry.invalidate()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Загружено товаров: {imported}, строк с ошибками: {errors}, "
+            f"за {elapsed:.1f} с ({imported / elapsed if elapsed else 0:.0f} строк/с)"
+        ))
+
+    def parse(self, row):
+        category_title = text(row, "category_title", max_length=99)
+        # Тот же slugify, что в Category.save: кириллица транслитерируется
+        category_slug = text(row, "category_slug", max_length=120) or slugify(category_title)
+        if not category_slug:
+            raise ValueError("не заполнено поле category_slug")
+        if slugify(category_slug) != category_slug:
+            raise ValueError(f"category_slug: недопустимый slug {category_slug!r}")
+
+        image, image_variants = self.resolve_image(text(row, "image", required=True))
+        return {
+            "id": integer(row, "id", minimum=1),
+            "title": text(row, "title", max_length=99, required=True),
+            "model": text(row, "model", max_length=99),
+            "year_of_production": integer(row, "year_of_production", minimum=2000),
+            "production_country": text(row, "production_country", max_length=100),
+            "price": integer(row, "price", minimum=1, required=True),
+            "count_available": integer(row, "count_available", minimum=0) or 0,
+            "category_slug": category_slug,
+            "category_title": category_title,
+            "image": image,
+            "has_image_variants": image_variants,
+        }
+
+    def resolve_image(self, value):
+        if value not in self.images:
+            self.images[value] = self.find_image(value)
+        if self.images[value] is None:
+            raise ValueError(f"image: файл {value!r} не найден")
+        return self.images[value]
+
+    def find_image(self, value):
+        # Путь как в export_products (products/ab/cd/<hash>.jpg) или имя внутри products/
+        for name in (value, product_image_path(None, value)):
+            try:
+                if self.storage.exists(name):
+                    return name, has_variants(name)
+            except SuspiciousFileOperation:
+                return None
+        if not self.images_dir:
+            return None
+
+        path = os.path.realpath(os.path.join(self.images_dir, value))
+        if not path.startswith(self.images_dir + os.sep) or not os.path.isfile(path):
+            return None
+        # Хранилище по хэшу вернёт уже лежащий файл, если такая картинка была
+        with open(path, "rb") as f:
+            name = self.storage.save(product_image_path(None, os.path.basename(path)), File(f))
+        if not has_variants(name):
+            generate_variants(name)
+        return name, True
+
+    @retry_on_locked
+    def flush(self, batch):
+        if not batch:
+            return 0
+        # Повтор id в одной пачке ломает ON CONFLICT, оставляем последнюю строку
+        rows = {}
+        for line_number, row in batch:
+            rows[row["id"] or ("new", line_number)] = row
+
+        # Кэш категорий меняем только после коммита: пачка может откатиться и повториться
+        categories = dict(self.categories)
+        try:
+            with transaction.atomic():
+                renamed = self.upsert_categories(rows.values(), categories)
+                products = Product.objects.bulk_create(
+                    [
+                        Product(
+                            pk=row["id"],
+                            category_id=categories[row["category_slug"]][0],
+                            **{field: row[field] for field in UPDATE_FIELDS if field != "category"},
+                        )
+                        for row in rows.values()
+                    ],
+                    update_conflicts=True,
+                    unique_fields=["id"],
+                    update_fields=UPDATE_FIELDS,
+                )
+                index_products([product.pk for product in products])
+                for category_id in renamed:
+                    index_category(category_id)
+        except IntegrityError as e:
+            raise CommandError(f"Строки {batch[0][0]}-{batch[-1][0]} не загружены: {e}")
+        if categories != self.categories:
+            self.categories = categories
+            self.categories_changed = True
+        return len(products)
+
+    def upsert_categories(self, rows, categories):
+        changed = {}
+        for row in rows:
+            slug, title = row["category_slug"], row["category_title"]
+            known = categories.get(slug)
+            if known is None:
+                changed[slug] = title or slug
+            elif title and title != known[1]:
+                changed[slug] = title
+        if not changed:
+            return []
+
+        renamed = [categories[slug][0] for slug in changed if slug in categories]
+        Category.objects.bulk_create(
+            [Category(slug=slug, title=title) for slug, title in changed.items()],
+            update_conflicts=True,
+            unique_fields=["slug"],
+            update_fields=["title"],
+        )
+        categories.update({
+            slug: (pk, title)
+            for pk, slug, title in Category.objects.filter(slug__in=changed).values_list("pk", "slug", "title")
+        })
+        return renamed
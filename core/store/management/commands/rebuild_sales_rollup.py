@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from store.models import DailySales
+
+
+def day(value):
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise CommandError(f"ожидается дата ГГГГ-ММ-ДД, получено {value!r}")
+    return parsed
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает сводку продаж по дням с нуля из заказов. Нужен после правки "
+        "заказов в обход OrderQuerySet (SQL, bulk-операции); обычно сводка обновляется сама"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="date_from", help="с даты ГГГГ-ММ-ДД включительно")
+        parser.add_argument("--to", dest="date_to", help="по дату ГГГГ-ММ-ДД включительно")
+        parser.add_argument("--batch-size", type=int, default=1000, help="строк сводки в одной вставке")
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size должен быть больше нуля")
+        start = options["date_from"] and day(options["date_from"])
+        end = options["date_to"] and day(options["date_to"])
+        if start and end and start > end:
+            raise CommandError("--from позже --to")
+
+        started = time.perf_counter()
+        created = DailySales.objects.rebuild(start, end, options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Строк сводки: {created} за {time.perf_counter() - started:.1f} с"
+        ))
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.models import Basket
+
+
+class Command(BaseCommand):
+    help = "Возвращает на склад товар из корзин с истёкшим резервом, пачками"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--pause", type=float, default=0, help="пауза между пачками, сек")
+        parser.add_argument(
+            "--loop", type=float, metavar="SECONDS",
+            help="не завершаться, а повторять проход каждые SECONDS секунд",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            lines, units = self.sweep(options["batch_size"], options["pause"])
+            self.stdout.write(f"Освобождено строк: {lines}, единиц товара: {units}")
+            if options["loop"] is None:
+                return
+            time.sleep(options["loop"])
+
+    def sweep(self, batch_size, pause):
+        # Каждая пачка - своя короткая транзакция, между ними проходят живые запросы
+        total_lines, total_units = 0, 0
+        while True:
+            lines, units = Basket.objects.release_expired(batch_size)
+            total_lines += lines
+            total_units += units
+            if lines < batch_size:
+                return total_lines, total_units
+            if pause:
+                time.sleep(pause)
@@ -0,0 +1,166 @@
+from collections import defaultdict
+from datetime import timedelta
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from store.cache import bump_catalog_version
+from store.models import Basket, Category, DailySales, Order, OrderItem, Product
+from store.search import index_products
+from users.models import CustomUser
+
+
+COUNTRIES = ["Россия", "Китай", "Германия", "Япония", "Корея", "США", "Италия", ""]
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполняет базу тестовыми данными для нагрузочных замеров: категории, товары, "
+        "пользователи, корзины и заказы создаются пачками через bulk_create"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--categories", type=int, default=10)
+        parser.add_argument("--products", type=int, default=1000)
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--baskets", type=int, default=50, help="пользователей с непустой корзиной")
+        parser.add_argument("--orders", type=int, default=500)
+        parser.add_argument("--items-per-order", type=int, default=3, help="наибольшее число позиций в заказе")
+        parser.add_argument("--days", type=int, default=30, help="за сколько дней раскидать даты заказов")
+        parser.add_argument("--password", default="seed-password", help="пароль всех созданных пользователей")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--seed", type=int, help="зерно генератора для повторяемых данных")
+
+    def handle(self, *args, **options):
+        if options["categories"] < 1 or options["products"] < 1:
+            raise CommandError("Нужна хотя бы одна категория и один товар")
+        if options["baskets"] > options["users"] or (options["orders"] and not options["users"]):
+            raise CommandError("Корзины и заказы создаются только для созданных пользователей")
+        if options["items_per_order"] < 1 or options["batch_size"] < 1:
+            raise CommandError("--items-per-order и --batch-size должны быть больше нуля")
+
+        self.random = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        # Префикс делает уникальные поля уникальными между запусками
+        self.prefix = f"seed{time.time_ns() // 1000 % 10 ** 10}"
+
+        started = time.perf_counter()
+        with transaction.atomic():
+            categories = self.create_categories(options["categories"])
+            products = self.create_products(options["products"], categories)
+            users = self.create_users(options["users"], options["password"])
+            lines = self.create_baskets(users[:options["baskets"]], products)
+            orders, items = self.create_orders(
+                options["orders"], users, products, options["items_per_order"], options["days"]
+            )
+            if orders:
+                # Заказы созданы в обход OrderQuerySet, сводку продаж за их дни пересчитываем
+                DailySales.objects.rebuild(start=timezone.localdate() - timedelta(days=options["days"] + 1))
+
+        # bulk_create не шлёт сигналов: поисковый индекс и кэш каталога обновляем сами
+        product_ids = [product.pk for product in products]
+        for start in range(0, len(product_ids), self.batch_size):
+            index_products(product_ids[start:start + self.batch_size])
+        bump_catalog_version()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Создано за {time.perf_counter() - started:.1f} с: категорий {len(categories)}, "
+            f"товаров {len(products)}, пользователей {len(users)}, строк корзин {lines}, "
+            f"заказов {len(orders)}, позиций заказов {items}"
+        ))
+
+    def create_categories(self, count):
+        return Category.objects.bulk_create([
+            Category(title=f"Категория {self.prefix}-{i}", slug=f"{self.prefix}-{i}")
+            for i in range(count)
+        ], batch_size=self.batch_size)
+
+    def create_products(self, count, categories):
+        year = timezone.now().year
+        return Product.objects.bulk_create([
+            Product(
+                image=f"products/{self.prefix}.jpg",
+                title=f"Товар {self.prefix}-{i}",
+                model=f"M-{self.random.randint(100, 999)}",
+                year_of_production=self.random.randint(2000, year),
+                production_country=self.random.choice(COUNTRIES),
+                price=self.random.randint(100, 100000),
+                category=self.random.choice(categories),
+                # Часть товаров не в наличии, как в живом каталоге
+                count_available=0 if self.random.random() < 0.1 else self.random.randint(1, 100),
+            )
+            for i in range(count)
+        ], batch_size=self.batch_size)
+
+    def create_users(self, count, password):
+        # Хэш пароля считается один раз: PBKDF2 на каждого пользователя дольше самой вставки
+        password = make_password(password)
+        return CustomUser.objects.bulk_create([
+            CustomUser(
+                username=f"{self.prefix}-{i}",
+                email=f"{self.prefix}-{i}@example.com",
+                first_name="Покупатель",
+                last_name="Тестовый",
+                rules=True,
+                password=password,
+            )
+            for i in range(count)
+        ], batch_size=self.batch_size)
+
+    def create_baskets(self, users, products):
+        # Товар в корзине зарезервирован, поэтому остаток уменьшается на его количество
+        reserved = {}
+        lines = []
+        for user in users:
+            for product in self.random.sample(products, min(3, len(products))):
+                quantity = min(self.random.randint(1, 3), product.count_available)
+                if not quantity:
+                    continue
+                product.count_available -= quantity
+                reserved[product.pk] = product
+                lines.append(Basket(user=user, product=product, quantity=quantity))
+        Basket.objects.bulk_create(lines, batch_size=self.batch_size)
+        Product.objects.bulk_update(reserved.values(), ["count_available"], batch_size=self.batch_size)
+        return len(lines)
+
+    def create_orders(self, count, users, products, items_per_order, days):
+        statuses = [Order.Status.NEW, Order.Status.CONFIRMED, Order.Status.CONFIRMED, Order.Status.CANCELLED]
+        orders, order_products = [], []
+        for _ in range(count):
+            chosen = [
+                (product, self.random.randint(1, 3))
+                for product in self.random.sample(products, min(self.random.randint(1, items_per_order), len(products)))
+            ]
+            status = self.random.choice(statuses)
+            orders.append(Order(
+                user=self.random.choice(users),
+                status=status,
+                cancelled_reason="Тестовая отмена" if status == Order.Status.CANCELLED else "",
+                items_count=sum(quantity for _, quantity in chosen),
+                total_price=sum(product.price * quantity for product, quantity in chosen),
+            ))
+            order_products.append(chosen)
+        orders = Order.objects.bulk_create(orders, batch_size=self.batch_size)
+
+        # auto_now_add ставит всем заказам текущее время, поэтому сдвигаем их назад
+        # по часам: одно UPDATE на час, а не CASE на каждую строку, как в bulk_update
+        by_hours = defaultdict(list)
+        for order in orders:
+            by_hours[self.random.randint(0, days * 24)].append(order.pk)
+        for hours, pks in by_hours.items():
+            for start in range(0, len(pks), self.batch_size):
+                Order.objects.filter(pk__in=pks[start:start + self.batch_size]).update(
+                    created_at=F("created_at") - timedelta(hours=hours, seconds=self.random.randint(0, 3599))
+                )
+
+        items = OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, quantity=quantity, price=product.price)
+            for order, chosen in zip(orders, order_products)
+            for product, quantity in chosen
+        ], batch_size=self.batch_size)
+        return orders, len(items)
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.replica import read_alias, sync_replica
+
+
+class Command(BaseCommand):
+    help = "Копирует основную SQLite базу в файл реплики для чтения (DATABASE_READ_ALIAS)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop", type=float, metavar="SECONDS",
+            help="не завершаться, а обновлять реплику каждые SECONDS секунд",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            if not sync_replica():
+                raise CommandError("Реплика не настроена: задайте SQLITE_REPLICA_PATH")
+            self.stdout.write(self.style.SUCCESS(
+                f"Реплика {read_alias()} обновлена за {time.perf_counter() - started:.2f} с"
+            ))
+            if options["loop"] is None:
+                return
+            time.sleep(max(options["loop"] - (time.perf_counter() - started), 0))
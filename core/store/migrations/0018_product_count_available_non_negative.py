@@ -0,0 +1,20 @@
+# Generated by Django 5.2 on 2026-10-18 13:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0017_order_orderitem"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="product",
+            constraint=models.CheckConstraint(
+                condition=models.Q(("count_available__gte", 0)),
+                name="product_count_available_non_negative",
+            ),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2 on 2026-10-18 14:02
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_order_totals(apps, schema_editor):
+    Order = apps.get_model("store", "Order")
+    OrderItem = apps.get_model("store", "OrderItem")
+    items = OrderItem.objects.filter(order=OuterRef("pk")).values("order")
+    Order.objects.update(
+        items_count=Coalesce(
+            Subquery(items.annotate(s=Sum("quantity")).values("s")),
+            Value(0),
+        ),
+        total_price=Coalesce(
+            Subquery(items.annotate(s=Sum(F("quantity") * F("price"))).values("s")),
+            Value(0),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0018_product_count_available_non_negative"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="items_count",
+            field=models.PositiveIntegerField(
+                default=0, verbose_name="количество товаров"
+            ),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="total_price",
+            field=models.PositiveBigIntegerField(
+                default=0, verbose_name="сумма заказа"
+            ),
+        ),
+        migrations.RunPython(fill_order_totals, migrations.RunPython.noop),
+    ]
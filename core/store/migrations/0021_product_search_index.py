@@ -0,0 +1,51 @@
+# Generated by Django 5.2 on 2026-10-18 15:10
+
+from django.db import migrations
+
+
+def normalized(column):
+    return f"replace(replace({column}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+PRODUCT_ROW = f"""
+    SELECT p.id, {normalized('p.title')}, {normalized('p.model')},
+           {normalized('p.production_country')}, {normalized('c.title')}
+    FROM store_product p JOIN store_category c ON c.id = p.category_id
+"""
+
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE store_product_fts USING fts5(
+        title, model, production_country, category_title,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    # Название товара важнее модели, страны и категории
+    "INSERT INTO store_product_fts(store_product_fts, rank) VALUES ('rank', 'bm25(10.0, 5.0, 1.0, 2.0)')",
+    f"INSERT INTO store_product_fts(rowid, title, model, production_country, category_title) {PRODUCT_ROW}",
+]
+
+DROP_SQL = [
+    "DROP TABLE IF EXISTS store_product_fts",
+]
+
+
+def run_sqlite(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != "sqlite":
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0020_store_query_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(run_sqlite(CREATE_SQL), run_sqlite(DROP_SQL)),
+    ]
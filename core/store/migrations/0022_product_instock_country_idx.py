@@ -0,0 +1,21 @@
+# Generated by Django 5.2 on 2026-10-18 15:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0021_product_search_index"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("count_available__gt", 0)),
+                fields=["production_country"],
+                name="product_instock_country_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2 on 2026-10-18 16:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0022_product_instock_country_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="has_image_variants",
+            field=models.BooleanField(
+                default=False,
+                editable=False,
+                verbose_name="есть уменьшенные копии картинки",
+            ),
+        ),
+    ]
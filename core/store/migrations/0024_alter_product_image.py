@@ -0,0 +1,26 @@
+# Generated by Django 5.2 on 2026-10-18 16:45
+
+import django.core.validators
+import store.models
+import store.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0023_product_has_image_variants"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="product",
+            name="image",
+            field=models.ImageField(
+                storage=store.storage.product_image_storage,
+                upload_to=store.models.product_image_path,
+                validators=[django.core.validators.validate_image_file_extension],
+                verbose_name="картинка",
+            ),
+        ),
+    ]
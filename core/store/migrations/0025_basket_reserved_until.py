@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-18 17:30
+
+import store.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0024_alter_product_image"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="basket",
+            name="reserved_until",
+            field=models.DateTimeField(
+                default=store.models.reservation_expiry, verbose_name="резерв до"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="basket",
+            index=models.Index(
+                fields=["reserved_until"], name="basket_reserved_until_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,145 @@
+# Generated by Django 5.2 on 2026-10-18 18:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def fill_sales_rollup(apps, schema_editor):
+    # То же, что DailySales.objects.rebuild(), на исторических моделях
+    Order = apps.get_model("store", "Order")
+    OrderItem = apps.get_model("store", "OrderItem")
+    DailySales = apps.get_model("store", "DailySales")
+    DailyProductSales = apps.get_model("store", "DailyProductSales")
+
+    live = ~Q(status="cancelled")
+    orders = Order.objects.annotate(day=TruncDate("created_at"))
+    days = orders.order_by().values("day").annotate(
+        orders_count=Count("pk"),
+        confirmed_count=Count("pk", filter=Q(status="confirmed")),
+        cancelled_count=Count("pk", filter=Q(status="cancelled")),
+        items_count=Coalesce(Sum("items_count", filter=live), 0),
+        revenue=Coalesce(Sum("total_price", filter=live), 0),
+    )
+    DailySales.objects.bulk_create(
+        [DailySales(**row) for row in days], batch_size=1000
+    )
+    products = (
+        OrderItem.objects.filter(order__in=orders.filter(live).values("pk"))
+        .annotate(day=TruncDate("order__created_at"))
+        .order_by()
+        .values("day", "product_id")
+        .annotate(sold=Sum("quantity"), amount=Sum(F("quantity") * F("price")))
+    )
+    DailyProductSales.objects.bulk_create(
+        [
+            DailyProductSales(
+                day=row["day"],
+                product_id=row["product_id"],
+                quantity=row["sold"],
+                revenue=row["amount"],
+            )
+            for row in products
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0025_basket_reserved_until"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailySales",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(unique=True, verbose_name="день")),
+                (
+                    "orders_count",
+                    models.IntegerField(default=0, verbose_name="заказов"),
+                ),
+                (
+                    "confirmed_count",
+                    models.IntegerField(default=0, verbose_name="подтверждено"),
+                ),
+                (
+                    "cancelled_count",
+                    models.IntegerField(default=0, verbose_name="отменено"),
+                ),
+                (
+                    "items_count",
+                    models.IntegerField(default=0, verbose_name="товаров продано"),
+                ),
+                (
+                    "revenue",
+                    models.BigIntegerField(default=0, verbose_name="выручка"),
+                ),
+            ],
+            options={
+                "verbose_name": "продажи за день",
+                "verbose_name_plural": "продажи по дням",
+                "ordering": ["-day"],
+            },
+        ),
+        migrations.CreateModel(
+            name="DailyProductSales",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(verbose_name="день")),
+                (
+                    "quantity",
+                    models.IntegerField(default=0, verbose_name="продано штук"),
+                ),
+                (
+                    "revenue",
+                    models.BigIntegerField(default=0, verbose_name="выручка"),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_sales",
+                        to="store.product",
+                        verbose_name="товар",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "продажи товара за день",
+                "verbose_name_plural": "продажи товаров по дням",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("day", "product"),
+                        name="dailyproductsales_day_product_uniq",
+                    )
+                ],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["count_available", "id"], name="product_count_idx"
+            ),
+        ),
+        migrations.RunPython(fill_sales_rollup, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,27 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, Q, Sum, Count, OuterRef, Subquery, Value, Case, When
+from django.db.models.functions import Coalesce, TruncDate
 from django.core.validators import validate_image_file_extension, MinValueValidator, MaxValueValidator
+from datetime import timedelta
+import functools
+import itertools
+import operator
+
+from django.conf import settings
 from django.utils import timezone
 
 from slugify import slugify
 
 from users.models import CustomUser
 
+from .images import generate_variants, has_variants, srcset
+from .storage import product_image_storage
+from .transactions import retry_on_locked
+
+
+def reservation_expiry():
+    return timezone.now() + timedelta(minutes=settings.BASKET_RESERVATION_MINUTES)
+
 
 def product_image_path(instance, filename):
     return f'products/{filename}'
@@ -33,10 +49,33 @@ class Category(models.Model):
         ordering = ['title']
 
 
+def restore_image(storage, name, content):
+    # Картинка уже была в хранилище, и очистка после удалённого товара могла
+    # стереть её (и копии) до коммита этой строки - тогда пишем заново
+    if storage.restore(name, content) and not has_variants(name):
+        generate_variants(name)
+
+
+class ProductQuerySet(models.QuerySet):
+    def reserve(self, product_id, quantity=1):
+        # Одно условное UPDATE: списываем, только если хватает остатка
+        return bool(
+            self.filter(pk=product_id, count_available__gte=quantity)
+            .update(count_available=F("count_available") - quantity)
+        )
+
+    def release(self, product_id, quantity=1):
+        return bool(
+            self.filter(pk=product_id)
+            .update(count_available=F("count_available") + quantity)
+        )
+
+
 class Product(models.Model):
     image = models.ImageField(
         "картинка",
         upload_to=product_image_path,
+        storage=product_image_storage,
         validators=[
             validate_image_file_extension,
         ]
@@ -82,15 +121,232 @@ class Product(models.Model):
         "дата создания",
         auto_now_add=True,
     )
+    has_image_variants = models.BooleanField(
+        "есть уменьшенные копии картинки",
+        default=False,
+        editable=False,
+    )
+
+    objects = ProductQuerySet.as_manager()
 
     class Meta:
         verbose_name = "товар"
         verbose_name_plural = "товары"
         ordering = ['-created_at']
+        indexes = [
+            # Частичные индексы только по товарам в наличии — под сортировки каталога
+            models.Index(
+                fields=['created_at', 'id'],
+                condition=models.Q(count_available__gt=0),
+                name='product_instock_created_idx',
+            ),
+            models.Index(
+                fields=['category', 'created_at', 'id'],
+                condition=models.Q(count_available__gt=0),
+                name='product_instock_cat_idx',
+            ),
+            models.Index(
+                fields=['price', 'id'],
+                condition=models.Q(count_available__gt=0),
+                name='product_instock_price_idx',
+            ),
+            models.Index(
+                fields=['year_of_production', 'id'],
+                condition=models.Q(count_available__gt=0),
+                name='product_instock_year_idx',
+            ),
+            models.Index(
+                fields=['title', 'id'],
+                condition=models.Q(count_available__gt=0),
+                name='product_instock_title_idx',
+            ),
+            models.Index(
+                fields=['production_country'],
+                condition=models.Q(count_available__gt=0),
+                name='product_instock_country_idx',
+            ),
+            # Товары, которые заканчиваются, - для панели администратора
+            models.Index(fields=['count_available', 'id'], name='product_count_idx'),
+            # Проверка ссылок на картинку перед удалением файла
+            models.Index(fields=['image'], name='product_image_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(count_available__gte=0),
+                name="product_count_available_non_negative",
+            ),
+        ]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        image_uploaded = bool(self.image) and not self.image._committed
+        content = self.image.file if image_uploaded else None
+        super().save(*args, **kwargs)
+        if image_uploaded:
+            # Копии пишем в обычное хранилище под тем же именем, что и оригинал.
+            # Если такая картинка уже была загружена, копии у неё тоже есть
+            if not has_variants(self.image.name):
+                generate_variants(self.image.name)
+            Product.objects.filter(pk=self.pk).update(has_image_variants=True)
+            self.has_image_variants = True
+            transaction.on_commit(functools.partial(restore_image, self.image.storage, self.image.name, content))
+
+    @property
+    def image_srcset(self):
+        return srcset(self.image.name, 'jpg')
+
+    @property
+    def image_webp_srcset(self):
+        return srcset(self.image.name, 'webp')
+
+
+class BasketQuerySet(models.QuerySet):
+    @retry_on_locked
+    def add_product(self, user, product_id):
+        # Резерв остатка и upsert строки корзины в одной короткой транзакции
+        with transaction.atomic():
+            if not Product.objects.reserve(product_id):
+                return False
+            updated = self.filter(user=user, product_id=product_id).update(
+                quantity=F("quantity") + 1, reserved_until=reservation_expiry()
+            )
+            if not updated:
+                try:
+                    with transaction.atomic():
+                        self.create(user=user, product_id=product_id)
+                except IntegrityError:
+                    # Строку успел создать параллельный запрос
+                    self.filter(user=user, product_id=product_id).update(
+                        quantity=F("quantity") + 1, reserved_until=reservation_expiry()
+                    )
+        return True
+
+    @retry_on_locked
+    def merge(self, user, quantities):
+        # Гостевая корзина {product_id: количество} вливается в корзину
+        # пользователя: остаток резервируется в пределах наличия, строки
+        # корзины пишутся одним INSERT ... ON CONFLICT DO UPDATE
+        with transaction.atomic():
+            available = dict(
+                Product.objects.filter(pk__in=quantities, count_available__gt=0)
+                .values_list("pk", "count_available")
+            )
+            reserved = {}
+            for product_id, quantity in quantities.items():
+                quantity = min(quantity, available.get(product_id, 0))
+                if quantity > 0 and Product.objects.reserve(product_id, quantity):
+                    reserved[product_id] = quantity
+            if not reserved:
+                return 0
+
+            existing = dict(
+                self.filter(user=user, product_id__in=reserved).values_list("product_id", "quantity")
+            )
+            self.bulk_create(
+                [
+                    self.model(user=user, product_id=product_id, quantity=existing.get(product_id, 0) + quantity)
+                    for product_id, quantity in reserved.items()
+                ],
+                update_conflicts=True,
+                unique_fields=["user", "product"],
+                update_fields=["quantity", "reserved_until"],
+            )
+        return sum(reserved.values())
+
+    @retry_on_locked
+    def set_quantities(self, user, quantities):
+        # Абсолютные количества {product_id: количество} за одну транзакцию:
+        # разница с текущей корзиной списывается и возвращается одним UPDATE,
+        # строки корзины пишутся одним upsert. Количество урезается до наличия.
+        # Возвращает итоговые количества и товары с уже новым остатком
+        with transaction.atomic():
+            products = Product.objects.select_for_update().in_bulk(list(quantities))
+            current = dict(
+                self.filter(user=user, product_id__in=products).values_list("product_id", "quantity")
+            )
+
+            result, deltas = {}, {}
+            for product_id, product in products.items():
+                have = current.get(product_id, 0)
+                wanted = min(quantities[product_id], have + product.count_available)
+                result[product_id] = wanted
+                if wanted != have:
+                    deltas[product_id] = wanted - have
+            if not deltas:
+                return result, products
+
+            Product.objects.filter(pk__in=deltas).update(
+                count_available=F("count_available") - Case(
+                    *[When(pk=product_id, then=Value(delta)) for product_id, delta in deltas.items()]
+                )
+            )
+            for product_id, delta in deltas.items():
+                products[product_id].count_available -= delta
+
+            self.filter(
+                user=user, product_id__in=[pk for pk in deltas if result[pk] == 0]
+            ).delete()
+            lines = [
+                self.model(user=user, product_id=pk, quantity=result[pk])
+                for pk in deltas
+                if result[pk] > 0
+            ]
+            if lines:
+                self.bulk_create(
+                    lines,
+                    update_conflicts=True,
+                    unique_fields=["user", "product"],
+                    update_fields=["quantity", "reserved_until"],
+                )
+        return result, products
+
+    @retry_on_locked
+    def remove_product(self, user, product_id):
+        with transaction.atomic():
+            lines = self.filter(user=user, product_id=product_id)
+            removed = lines.filter(quantity__gt=1).update(
+                quantity=F("quantity") - 1, reserved_until=reservation_expiry()
+            )
+            if not removed:
+                removed, _ = lines.filter(quantity=1).delete()
+            if not removed:
+                return False
+            Product.objects.release(product_id)
+        return True
+
+    @retry_on_locked
+    def release_expired(self, batch_size=500, now=None):
+        # Одна пачка просроченных строк: остаток возвращается одним UPDATE
+        # с подзапросом, строки удаляются. Срок перепроверяется внутри
+        # транзакции, так что строку, которую только что продлили, не тронем.
+        # Возвращает (строк, единиц товара)
+        now = now or timezone.now()
+        with transaction.atomic():
+            ids = list(
+                self.filter(reserved_until__lt=now)
+                .select_for_update()
+                .order_by("reserved_until")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not ids:
+                return 0, 0
+            lines = self.filter(pk__in=ids, reserved_until__lt=now)
+            units = lines.aggregate(s=Sum("quantity"))["s"] or 0
+            quantities = (
+                lines.filter(product=OuterRef("pk"))
+                .order_by()
+                .values("product")
+                .annotate(s=Sum("quantity"))
+                .values("s")
+            )
+            Product.objects.filter(pk__in=lines.values("product")).update(
+                count_available=F("count_available") + Subquery(quantities)
+            )
+            deleted, _ = lines.delete()
+        return deleted, units
+
 
 class Basket(models.Model):
     user = models.ForeignKey(
@@ -114,12 +370,24 @@ class Basket(models.Model):
         "дата добавления",
         auto_now_add=True
     )
+    # Пока срок не вышел, товар зарезервирован; потом release_expired_reservations
+    # возвращает остаток и убирает строку. Продлевается при каждом изменении
+    reserved_until = models.DateTimeField(
+        "резерв до",
+        default=reservation_expiry,
+    )
+
+    objects = BasketQuerySet.as_manager()
 
     class Meta:
         verbose_name = "корзина"
         verbose_name_plural = "корзины"
         unique_together = ['user', 'product']
         ordering = ['-added_at']
+        indexes = [
+            models.Index(fields=['user', '-added_at'], name='basket_user_added_idx'),
+            models.Index(fields=['reserved_until'], name='basket_reserved_until_idx'),
+        ]
 
     def __str__(self):
         return f"Корзина {self.user.username}: {self.product.title}, {self.quantity} шт. - {self.get_total_price()}"
@@ -128,6 +396,108 @@ class Basket(models.Model):
         return self.quantity * self.product.price
 
 
+class OrderQuerySet(models.QuerySet):
+    @retry_on_locked
+    def create_from_basket(self, user):
+        # Весь заказ в одной транзакции и за фиксированное число запросов.
+        # Остаток уже зарезервирован при добавлении в корзину, поэтому
+        # здесь он повторно не списывается.
+        with transaction.atomic():
+            basket_items = list(
+                Basket.objects.filter(user=user)
+                .select_related("product")
+                .select_for_update(of=("self",))
+            )
+            if not basket_items:
+                return None
+
+            order = self.create(
+                user=user,
+                items_count=sum(item.quantity for item in basket_items),
+                total_price=sum(item.get_total_price() for item in basket_items),
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order,
+                    product=item.product,
+                    quantity=item.quantity,
+                    price=item.product.price,
+                )
+                for item in basket_items
+            ])
+            Basket.objects.filter(pk__in=[item.pk for item in basket_items]).delete()
+            DailySales.objects.record(self.filter(pk=order.pk))
+        return order
+
+    def restore_stock(self):
+        # Возврат остатков по всем заказам выборки одним UPDATE:
+        # строки одного товара суммируются в подзапросе
+        items = OrderItem.objects.filter(order__in=self.values("pk"))
+        quantities = (
+            items.filter(product=OuterRef("pk"))
+            .values("product")
+            .annotate(s=Sum("quantity"))
+            .values("s")
+        )
+        return Product.objects.filter(pk__in=items.values("product")).update(
+            count_available=F("count_available") + Subquery(quantities)
+        )
+
+    @retry_on_locked
+    def cancel(self, reason=""):
+        # Остатки возвращаются только для ещё не отменённых заказов,
+        # поэтому повторная отмена ничего не вернёт дважды
+        with transaction.atomic():
+            pending = list(
+                self.exclude(status=Order.Status.CANCELLED)
+                .select_for_update()
+                .values_list("pk", flat=True)
+            )
+            if pending:
+                pending_orders = self.model.objects.filter(pk__in=pending)
+                pending_orders.restore_stock()
+                DailySales.objects.record(pending_orders, sign=-1)
+            updated = self.update(status=Order.Status.CANCELLED, cancelled_reason=reason[:255])
+            if pending:
+                DailySales.objects.record(pending_orders)
+            return updated
+
+    @retry_on_locked
+    def confirm(self):
+        # Подтверждаются только новые заказы: у отменённого остаток уже возвращён
+        with transaction.atomic():
+            pending = list(
+                self.filter(status=Order.Status.NEW).select_for_update().values_list("pk", flat=True)
+            )
+            if not pending:
+                return 0
+            pending_orders = self.model.objects.filter(pk__in=pending)
+            DailySales.objects.record(pending_orders, sign=-1)
+            updated = pending_orders.update(status=Order.Status.CONFIRMED, cancelled_reason="")
+            DailySales.objects.record(pending_orders)
+            return updated
+
+    def delete_with_sales(self):
+        # Удаление заказов вместе с их вкладом в сводку продаж
+        with transaction.atomic():
+            DailySales.objects.record(self, sign=-1)
+            return self.delete()
+
+    def refresh_totals(self):
+        # Пересчёт денормализованных итогов одним UPDATE с подзапросами
+        items = OrderItem.objects.filter(order=OuterRef("pk")).values("order")
+        return self.update(
+            items_count=Coalesce(
+                Subquery(items.annotate(s=Sum("quantity")).values("s")),
+                Value(0),
+            ),
+            total_price=Coalesce(
+                Subquery(items.annotate(s=Sum(F("quantity") * F("price"))).values("s")),
+                Value(0),
+            ),
+        )
+
+
 class Order(models.Model):
     class Status(models.TextChoices):
         NEW = "new", "Новый"
@@ -151,30 +521,35 @@ class Order(models.Model):
         max_length=255,
         blank=True,
     )
+    items_count = models.PositiveIntegerField(
+        "количество товаров",
+        default=0,
+    )
+    total_price = models.PositiveBigIntegerField(
+        "сумма заказа",
+        default=0,
+    )
     created_at = models.DateTimeField(
         "дата создания",
         auto_now_add=True,
     )
 
+    objects = OrderQuerySet.as_manager()
+
     class Meta:
         verbose_name = "заказ"
         verbose_name_plural = "заказы"
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["user", "-created_at"], name="order_user_created_idx"),
+            models.Index(fields=["status", "-created_at"], name="order_status_created_idx"),
+        ]
 
     def __str__(self):
         return f"Заказ #{self.id} от {self.user.username} ({self.get_status_display()})"
 
-    def get_items_count(self):
-        return sum(item.quantity for item in self.items.all())
-
-    def get_total_price(self):
-        return sum(item.get_total_price() for item in self.items.all())
-
     def restore_stock(self):
-        for item in self.items.select_related("product"):
-            product = item.product
-            product.count_available += item.quantity
-            product.save(update_fields=["count_available"])
+        return Order.objects.filter(pk=self.pk).restore_stock()
 
 
 class OrderItem(models.Model):
@@ -200,5 +575,157 @@ class OrderItem(models.Model):
     def __str__(self):
         return f"{self.product.title} x {self.quantity}"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        Order.objects.filter(pk=self.order_id).refresh_totals()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        Order.objects.filter(pk=self.order_id).refresh_totals()
+        return result
+
     def get_total_price(self):
-        return self.quantity * self.price
\ No newline at end of file
+        return self.quantity * self.price
+
+
+# Ключей сводки в одном UPDATE: длинная цепочка OR упирается в лимит глубины выражений SQLite
+ROLLUP_BATCH_SIZE = 200
+
+
+class DailySalesQuerySet(models.QuerySet):
+    def day_totals(self, orders):
+        # Итоги заказов по дню создания. Выручка и товары - без отменённых заказов
+        live = ~Q(status=Order.Status.CANCELLED)
+        return (
+            orders.annotate(day=TruncDate("created_at"))
+            .order_by()
+            .values("day")
+            .annotate(
+                orders_count=Count("pk"),
+                confirmed_count=Count("pk", filter=Q(status=Order.Status.CONFIRMED)),
+                cancelled_count=Count("pk", filter=Q(status=Order.Status.CANCELLED)),
+                items_count=Coalesce(Sum("items_count", filter=live), 0),
+                revenue=Coalesce(Sum("total_price", filter=live), 0),
+            )
+        )
+
+    def product_totals(self, orders):
+        # Продажи товаров по дням. Агрегаты названы не как поля OrderItem:
+        # иначе F("quantity") в выручке сослался бы на сумму, а не на поле
+        rows = (
+            OrderItem.objects.filter(order__in=orders.exclude(status=Order.Status.CANCELLED).values("pk"))
+            .annotate(day=TruncDate("order__created_at"))
+            .order_by()
+            .values("day", "product_id")
+            .annotate(sold=Sum("quantity"), amount=Sum(F("quantity") * F("price")))
+        )
+        return (
+            {"day": row["day"], "product_id": row["product_id"], "quantity": row["sold"], "revenue": row["amount"]}
+            for row in rows.iterator(chunk_size=1000)
+        )
+
+    def record(self, orders, sign=1):
+        # Добавляет (sign=1) или убирает (sign=-1) вклад заказов в сводку по
+        # дням создания заказа. Смена статуса - убрать вклад со старым статусом
+        # и добавить с новым
+        self._apply(self.model, ("day",), list(self.day_totals(orders)), sign)
+        self._apply(DailyProductSales, ("day", "product_id"), list(self.product_totals(orders)), sign)
+
+    def _apply(self, model, keys, rows, sign):
+        # Строки сводки создаются пустыми, затем все счётчики сдвигаются одним
+        # UPDATE с CASE по ключам, так что параллельные заказы за тот же день
+        # не затирают друг друга, а число запросов не зависит от числа позиций.
+        # Строки, обнулившиеся после вычитания, удаляются
+        fields = [field for field in rows[0] if field not in keys] if rows else []
+        for start in range(0, len(rows), ROLLUP_BATCH_SIZE):
+            batch = rows[start:start + ROLLUP_BATCH_SIZE]
+            matches = [Q(**{key: row[key] for key in keys}) for row in batch]
+            scope = model.objects.filter(functools.reduce(operator.or_, matches))
+            model.objects.bulk_create(
+                [model(**{key: row[key] for key in keys}) for row in batch],
+                ignore_conflicts=True,
+            )
+            scope.update(**{
+                field: F(field) + Case(
+                    *[When(match, then=Value(sign * row[field])) for match, row in zip(matches, batch)],
+                    default=Value(0),
+                )
+                for field in fields
+            })
+            if sign < 0:
+                scope.filter(**{field: 0 for field in fields}).delete()
+
+    def rebuild(self, start=None, end=None, batch_size=1000):
+        # Пересчёт сводки с нуля за дни [start, end] (включительно) - для
+        # заполнения истории и после правки заказов в обход методов OrderQuerySet
+        orders = Order.objects.annotate(day=TruncDate("created_at"))
+        rollups = self.all()
+        product_rollups = DailyProductSales.objects.all()
+        if start:
+            orders = orders.filter(day__gte=start)
+            rollups = rollups.filter(day__gte=start)
+            product_rollups = product_rollups.filter(day__gte=start)
+        if end:
+            orders = orders.filter(day__lte=end)
+            rollups = rollups.filter(day__lte=end)
+            product_rollups = product_rollups.filter(day__lte=end)
+
+        with transaction.atomic():
+            rollups.delete()
+            product_rollups.delete()
+            created = self._insert_rows(self.model, self.day_totals(orders).iterator(chunk_size=batch_size), batch_size)
+            created += self._insert_rows(DailyProductSales, self.product_totals(orders), batch_size)
+        return created
+
+    def _insert_rows(self, model, rows, batch_size):
+        # Сгруппированные строки читаются курсором и пишутся пачками
+        created = 0
+        rows = iter(rows)
+        while batch := [model(**row) for row in itertools.islice(rows, batch_size)]:
+            created += len(model.objects.bulk_create(batch))
+        return created
+
+
+class DailySales(models.Model):
+    day = models.DateField("день", unique=True)
+    orders_count = models.IntegerField("заказов", default=0)
+    confirmed_count = models.IntegerField("подтверждено", default=0)
+    cancelled_count = models.IntegerField("отменено", default=0)
+    items_count = models.IntegerField("товаров продано", default=0)
+    revenue = models.BigIntegerField("выручка", default=0)
+
+    objects = DailySalesQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "продажи за день"
+        verbose_name_plural = "продажи по дням"
+        ordering = ["-day"]
+
+    def __str__(self):
+        return f"{self.day}: {self.orders_count} заказов, {self.revenue} ₽"
+
+    @property
+    def cancellation_rate(self):
+        return self.cancelled_count / self.orders_count if self.orders_count else 0
+
+
+class DailyProductSales(models.Model):
+    day = models.DateField("день")
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name="daily_sales",
+        verbose_name="товар",
+    )
+    quantity = models.IntegerField("продано штук", default=0)
+    revenue = models.BigIntegerField("выручка", default=0)
+
+    class Meta:
+        verbose_name = "продажи товара за день"
+        verbose_name_plural = "продажи товаров по дням"
+        constraints = [
+            models.UniqueConstraint(fields=["day", "product"], name="dailyproductsales_day_product_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.day}: {self.product_id} x {self.quantity}"
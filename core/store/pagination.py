@@ -0,0 +1,134 @@
+import base64
+import json
+
+from django.db.models import F, Q
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(direction, value, pk):
+    if hasattr(value, "isoformat"):
+        value = value.isoformat()
+    raw = json.dumps([direction, value, pk], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, field):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        direction, value, pk = json.loads(raw)
+        if direction not in ("next", "prev"):
+            raise ValueError(direction)
+        value = field.to_python(value) if value is not None else None
+        return direction, value, int(pk)
+    except Exception as exc:
+        raise InvalidCursor(cursor) from exc
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Пагинация по ключу (field, id) вместо OFFSET и COUNT(*).
+
+    NULL-значения всегда идут первыми при сортировке по возрастанию и
+    последними при сортировке по убыванию, поэтому обратный порядок
+    получается простой сменой направления.
+    """
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.descending = ordering.startswith("-")
+        self.field_name = ordering.lstrip("-")
+        self.field = queryset.model._meta.get_field(self.field_name)
+        self.per_page = per_page
+
+    def _order_by(self, descending):
+        if descending:
+            key = F(self.field_name).desc(nulls_last=True) if self.field.null else f"-{self.field_name}"
+            return self.queryset.order_by(key, "-id")
+        key = F(self.field_name).asc(nulls_first=True) if self.field.null else self.field_name
+        return self.queryset.order_by(key, "id")
+
+    def _after(self, descending, value, pk):
+        name = self.field_name
+        if value is None:
+            if descending:
+                return Q(**{f"{name}__isnull": True, "id__lt": pk})
+            return Q(**{f"{name}__isnull": False}) | Q(**{f"{name}__isnull": True, "id__gt": pk})
+
+        if descending:
+            condition = Q(**{f"{name}__lt": value}) | Q(**{name: value, "id__lt": pk})
+            if self.field.null:
+                condition |= Q(**{f"{name}__isnull": True})
+            return condition
+        return Q(**{f"{name}__gt": value}) | Q(**{name: value, "id__gt": pk})
+
+    def _cursor(self, direction, obj):
+        return encode_cursor(direction, getattr(obj, self.field_name), obj.pk)
+
+    def _page_queryset(self, direction, value, pk):
+        # Для перехода назад идём в обратном порядке и разворачиваем результат
+        descending = self.descending if direction == "next" else not self.descending
+        queryset = self._order_by(descending)
+        if pk is not None:
+            queryset = queryset.filter(self._after(descending, value, pk))
+        return queryset[:self.per_page + 1]
+
+    def _decode(self, cursor):
+        if not cursor:
+            return "next", None, None
+        return decode_cursor(cursor, self.field)
+
+    def page_queryset(self, cursor=None):
+        return self._page_queryset(*self._decode(cursor))
+
+    def get_page(self, cursor=None):
+        direction, value, pk = self._decode(cursor)
+        return self._make_page(direction, pk, list(self._page_queryset(direction, value, pk)))
+
+    async def aget_page(self, cursor=None):
+        direction, value, pk = self._decode(cursor)
+        rows = [obj async for obj in self._page_queryset(direction, value, pk)]
+        return self._make_page(direction, pk, rows)
+
+    def _make_page(self, direction, pk, rows):
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == "prev":
+            rows.reverse()
+
+        if not rows:
+            return KeysetPage(rows, None, None)
+
+        if direction == "next":
+            has_next, has_previous = has_more, pk is not None
+        else:
+            has_next, has_previous = True, has_more
+        return KeysetPage(
+            rows,
+            self._cursor("next", rows[-1]) if has_next else None,
+            self._cursor("prev", rows[0]) if has_previous else None,
+        )
@@ -0,0 +1,97 @@
+import threading
+import time
+
+from django.core.cache import cache
+
+from .models import Category
+
+
+CATEGORY_VERSION_KEY = "store:categories:version"
+CATEGORY_CHECK_INTERVAL = 1  # как часто сверяться с версией других воркеров
+
+
+class CategoryRegistry:
+    # Категории загружаются один раз на процесс; другие воркеры узнают
+    # об изменениях через версию в общем кэше
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._categories = None
+        self._ids_by_slug = {}
+        self._version = None
+        self._checked_at = 0
+
+    def _shared_version(self):
+        version = cache.get(CATEGORY_VERSION_KEY)
+        if version is None:
+            version = time.time_ns()
+            if not cache.add(CATEGORY_VERSION_KEY, version, None):
+                version = cache.get(CATEGORY_VERSION_KEY, version)
+        return version
+
+    async def _ashared_version(self):
+        version = await cache.aget(CATEGORY_VERSION_KEY)
+        if version is None:
+            version = time.time_ns()
+            if not await cache.aadd(CATEGORY_VERSION_KEY, version, None):
+                version = await cache.aget(CATEGORY_VERSION_KEY, version)
+        return version
+
+    def _store(self, categories, version, checked_at):
+        with self._lock:
+            self._ids_by_slug = {category.slug: category.id for category in categories}
+            self._categories = categories
+            self._version = version
+            self._checked_at = checked_at
+
+    def _ensure_loaded(self):
+        now = time.monotonic()
+        if self._categories is not None and now - self._checked_at < CATEGORY_CHECK_INTERVAL:
+            return
+        with self._lock:
+            version = self._shared_version()
+            if self._categories is None or version != self._version:
+                # Только с основной базы: отставшая реплика сохранила бы
+                # старый список под новой версией до следующего изменения
+                categories = list(Category.objects.using("default"))
+                self._ids_by_slug = {category.slug: category.id for category in categories}
+                self._categories = categories
+                self._version = version
+            self._checked_at = now
+
+    async def _aensure_loaded(self):
+        # Блокировку нельзя держать через await: в худшем случае две корутины
+        # загрузят категории одновременно, и выиграет последняя
+        now = time.monotonic()
+        if self._categories is not None and now - self._checked_at < CATEGORY_CHECK_INTERVAL:
+            return
+        version = await self._ashared_version()
+        if self._categories is None or version != self._version:
+            categories = [category async for category in Category.objects.using("default")]
+            self._store(categories, version, now)
+        else:
+            self._checked_at = now
+
+    def all(self):
+        self._ensure_loaded()
+        return self._categories
+
+    def get_id(self, slug):
+        self._ensure_loaded()
+        return self._ids_by_slug.get(slug)
+
+    async def aall(self):
+        await self._aensure_loaded()
+        return self._categories
+
+    async def aget_id(self, slug):
+        await self._aensure_loaded()
+        return self._ids_by_slug.get(slug)
+
+    def invalidate(self):
+        cache.set(CATEGORY_VERSION_KEY, time.time_ns(), None)
+        with self._lock:
+            self._categories = None
+
+
+category_registry = CategoryRegistry()
@@ -0,0 +1,112 @@
+import sqlite3
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.utils.decorators import sync_and_async_middleware
+
+
+PIN_COOKIE = "primary_pin"
+
+# Состояние текущего запроса: читать ли с основной базы и была ли запись.
+# ContextVar работает и в потоках WSGI, и в корутинах ASGI
+_request_state = ContextVar("replica_request_state", default=None)
+
+
+def read_alias():
+    return getattr(settings, "DATABASE_READ_ALIAS", "default")
+
+
+class PrimaryReplicaRouter:
+    """
+    Чтение каталога и заказов идёт на DATABASE_READ_ALIAS, всё остальное -
+    на основную базу. На основную же уходят чтения внутри транзакции и чтения
+    пользователя, который недавно что-то записал (см. primary_pin_middleware).
+    """
+
+    # Корзина читается сразу после записи, поэтому всегда с основной базы
+    replica_models = {"store.product", "store.category", "store.order", "store.orderitem"}
+
+    def db_for_read(self, model, **hints):
+        alias = read_alias()
+        if alias == "default" or model._meta.label_lower not in self.replica_models:
+            return "default"
+        state = _request_state.get()
+        if state is not None and (state["pinned"] or state["wrote"]):
+            return "default"
+        if connections["default"].in_atomic_block:
+            return "default"
+        return alias
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state["wrote"] = True
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {"default", read_alias()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Реплика получает схему вместе с данными из основной базы
+        if db != "default" and db == read_alias():
+            return False
+        return None
+
+
+def start_request(request):
+    state = {"pinned": PIN_COOKIE in request.COOKIES, "wrote": False}
+    return state, _request_state.set(state)
+
+
+def finish_request(state, token, response):
+    _request_state.reset(token)
+    if state["wrote"]:
+        # Пока реплика догоняет, этот клиент читает с основной базы
+        response.set_cookie(
+            PIN_COOKIE, "1", max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite="Lax"
+        )
+    return response
+
+
+@sync_and_async_middleware
+def primary_pin_middleware(get_response):
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            state, token = start_request(request)
+            response = await get_response(request)
+            return finish_request(state, token, response)
+    else:
+        def middleware(request):
+            state, token = start_request(request)
+            response = get_response(request)
+            return finish_request(state, token, response)
+    return middleware
+
+
+def sync_replica(alias=None):
+    # Заглушка репликации для SQLite: копия основной базы через backup API
+    alias = alias or read_alias()
+    if alias == "default":
+        return False
+    source = connections["default"]
+    if source.in_atomic_block:
+        # backup() из незакоммиченной транзакции на том же соединении зависает
+        raise RuntimeError("Реплику нельзя синхронизировать внутри транзакции")
+
+    if connections[alias].settings_dict["NAME"] == source.settings_dict["NAME"]:
+        # Реплика указывает на тот же файл: копировать нечего
+        return True
+
+    connections[alias].close()
+    source.ensure_connection()
+    target = sqlite3.connect(connections[alias].settings_dict["NAME"])
+    try:
+        source.connection.backup(target)
+    finally:
+        target.close()
+    return True
@@ -0,0 +1,100 @@
+import re
+
+from django.db import connection
+
+
+MAX_TERMS = 8
+MIN_STEM_LENGTH = 4
+
+# Частые окончания русских слов: отрезаем их и ищем по префиксу,
+# чтобы «телевизоры» находили «телевизор»
+RUSSIAN_ENDINGS = sorted(
+    [
+        "ами", "ями", "ого", "его", "ому", "ему", "ыми", "ими", "ой", "ей",
+        "ий", "ый", "ая", "яя", "ое", "ее", "ые", "ие", "ов", "ев", "ам",
+        "ям", "ах", "ях", "ом", "ем", "ы", "и", "а", "я", "о", "е", "у", "ю",
+    ],
+    key=len,
+    reverse=True,
+)
+
+
+def stem(term):
+    for ending in RUSSIAN_ENDINGS:
+        if term.endswith(ending) and len(term) - len(ending) >= MIN_STEM_LENGTH:
+            return term[:-len(ending)]
+    return term
+
+
+def normalized(column):
+    return f"replace(replace({column}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+INDEX_SQL = f"""
+    INSERT INTO store_product_fts(rowid, title, model, production_country, category_title)
+    SELECT p.id, {normalized('p.title')}, {normalized('p.model')},
+           {normalized('p.production_country')}, {normalized('c.title')}
+    FROM store_product p JOIN store_category c ON c.id = p.category_id
+"""
+
+
+def search_enabled():
+    return connection.vendor == "sqlite"
+
+
+def unindex_products(product_ids):
+    if not search_enabled() or not product_ids:
+        return
+    placeholders = ", ".join(["%s"] * len(product_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM store_product_fts WHERE rowid IN ({placeholders})",
+            list(product_ids),
+        )
+
+
+def index_products(product_ids):
+    # Индекс обновляется из Python, а не триггерами: триггеры на store_product
+    # ломают пересоздание таблицы в миграциях SQLite
+    if not search_enabled() or not product_ids:
+        return
+    unindex_products(product_ids)
+    placeholders = ", ".join(["%s"] * len(product_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"{INDEX_SQL} WHERE p.id IN ({placeholders})", list(product_ids))
+
+
+def index_category(category_id):
+    if not search_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "DELETE FROM store_product_fts WHERE rowid IN "
+            "(SELECT id FROM store_product WHERE category_id = %s)",
+            [category_id],
+        )
+        cursor.execute(f"{INDEX_SQL} WHERE p.category_id = %s", [category_id])
+
+
+def build_match_query(query):
+    terms = re.findall(r"\w+", query.lower().replace("ё", "е"))[:MAX_TERMS]
+    return " ".join(f'"{stem(term)}"*' for term in terms)
+
+
+def search_product_ids(query, limit, offset=0):
+    match = build_match_query(query)
+    if not match or not search_enabled():
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT store_product_fts.rowid
+            FROM store_product_fts
+            JOIN store_product ON store_product.id = store_product_fts.rowid
+            WHERE store_product_fts MATCH %s AND store_product.count_available > 0
+            ORDER BY store_product_fts.rank, store_product_fts.rowid
+            LIMIT %s OFFSET %s
+            """,
+            [match, limit, offset],
+        )
+        return [row[0] for row in cursor.fetchall()]
@@ -0,0 +1,57 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django_cleanup.signals import cleanup_post_delete
+
+from .basket import GuestBasket
+from .cache import bump_catalog_version
+from .images import delete_variants
+from .models import Product, Category
+from .registry import category_registry
+from .search import index_products, unindex_products, index_category
+
+
+# Версии сбрасываются после коммита, иначе другой воркер может успеть
+# закэшировать ещё старые данные под новой версией
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_catalog(sender, **kwargs):
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_categories(sender, **kwargs):
+    transaction.on_commit(category_registry.invalidate)
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    index_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    unindex_products([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def reindex_category(sender, instance, created, **kwargs):
+    if not created:
+        index_category(instance.pk)
+
+
+@receiver(cleanup_post_delete, sender=Product)
+def delete_image_variants(sender, file_name, file, **kwargs):
+    # Оригинал остался на месте, значит на него ссылается другой товар
+    if not file.storage.exists(file_name):
+        delete_variants(file_name)
+
+
+# И вход, и регистрация проходят через login(), который сохраняет данные
+# анонимной сессии, поэтому гостевая корзина к этому моменту ещё на месте
+@receiver(user_logged_in)
+def merge_guest_basket(sender, request, user, **kwargs):
+    if request is not None and hasattr(request, "session"):
+        GuestBasket(request.session).merge_into(user)
@@ -0,0 +1,77 @@
+import hashlib
+import posixpath
+import re
+
+from django.apps import apps
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+# products/ab/cd/<sha256>.jpg и уменьшенные копии <sha256>_640w.webp
+CONTENT_ADDRESSED_NAME_RE = re.compile(r"(?:^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(?:_\d+w)?\.\w+$")
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранит файл под именем sha256 его содержимого, разложенным по
+    подпапкам ab/cd/, поэтому одинаковые картинки лежат на диске один раз.
+
+    Счётчик ссылок не хранится отдельно: перед удалением проверяем, ссылается
+    ли ещё на файл хоть один товар. django_cleanup удаляет старый файл уже
+    после коммита, так что удалённая или изменённая строка в подсчёт не попадает.
+    Если файл удалили между save() нового товара и коммитом его строки,
+    Product.save() после коммита пишет его заново через restore().
+    """
+
+    def __init__(self, **kwargs):
+        # Одинаковое имя значит одинаковое содержимое, суффиксы не нужны
+        kwargs.setdefault("allow_overwrite", True)
+        super().__init__(**kwargs)
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        if hasattr(content, "seek"):
+            content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        if hasattr(content, "seek"):
+            content.seek(0)
+
+        directory, filename = posixpath.split(str(name).replace("\\", "/"))
+        _, ext = posixpath.splitext(filename)
+        hexdigest = digest.hexdigest()
+        return posixpath.join(directory, hexdigest[:2], hexdigest[2:4], hexdigest + ext.lower())
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
+
+    def is_referenced(self, name):
+        # Только основная база: реплика может ещё не видеть новую ссылку
+        Product = apps.get_model("store", "Product")
+        return Product.objects.using("default").filter(image=name).exists()
+
+    def delete(self, name):
+        if name and self.is_referenced(name):
+            return
+        super().delete(name)
+
+    def restore(self, name, content):
+        # save() не пишет файл, который уже лежит в хранилище. Возвращает True,
+        # если файл успели удалить и он записан заново
+        if self.exists(name) or content is None or content.closed:
+            return False
+        content.seek(0)
+        super().save(name, content)
+        return True
+
+
+def product_image_storage():
+    return ContentAddressedStorage()
@@ -0,0 +1,66 @@
+import csv
+import json
+import os
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+FORMATS = ("csv", "jsonl")
+
+
+def detect_format(path, fmt=None):
+    if fmt:
+        return fmt
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".jsonl", ".ndjson"):
+        return "jsonl"
+    if extension == ".csv":
+        return "csv"
+    raise ValueError(f"Не удалось определить формат по имени {path}, укажите --format")
+
+
+def read_rows(file, fmt):
+    # Файл читается построчно: в памяти только текущая строка.
+    # Отдаёт (номер строки в файле, словарь)
+    if fmt == "csv":
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"строка {line_number}: некорректный JSON ({e})")
+        if not isinstance(row, dict):
+            raise ValueError(f"строка {line_number}: ожидался объект JSON")
+        yield line_number, row
+
+
+class Echo:
+    # csv.writer пишет в "файл", который просто возвращает строку
+    def write(self, value):
+        return value
+
+
+def encode_rows(rows, fields, fmt):
+    # Строки кодируются по одной, поэтому годится и для записи в файл,
+    # и для StreamingHttpResponse
+    if fmt == "csv":
+        writer = csv.writer(Echo())
+        yield writer.writerow(fields)
+        for row in rows:
+            yield writer.writerow([csv_value(row[field]) for field in fields])
+        return
+    for row in rows:
+        yield json.dumps({field: row[field] for field in fields}, ensure_ascii=False, cls=DjangoJSONEncoder) + "\n"
+
+
+def csv_value(value):
+    if value is None:
+        return ""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
@@ -1,3 +1,415 @@
-from django.test import TestCase
+import importlib
+import json
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.models import F
+from django.http import HttpResponse, QueryDict
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from users.models import CustomUser
+from .models import Category, Product, Basket, Order, DailySales, DailyProductSales, DailySalesQuerySet
+from .registry import CategoryRegistry
+from .replica import PIN_COOKIE, PrimaryReplicaRouter, finish_request, start_request, sync_replica
+from .facets import CatalogFilters
+from .pagination import InvalidCursor, KeysetPaginator
+from .cache import CATALOG_LOCK_TIMEOUT, acquire_lock, lock_path, release_lock
+from .views import StoreCatalogView
+
+
+# Кэш в памяти процесса, чтобы тесты не писали в общий файловый кэш
+TEST_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "sessions": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "sessions"},
+}
+
+
+def setUpModule():
+    # Тестовая база создаётся без миграций, а поисковый индекс - таблица FTS5
+    # из миграции 0021, которой нет среди моделей
+    migration = importlib.import_module("store.migrations.0021_product_search_index")
+    with connection.cursor() as cursor:
+        for sql in migration.CREATE_SQL:
+            cursor.execute(sql)
+
+
+def create_user(username):
+    return CustomUser.objects.create_user(username, f"{username}@example.com")
+
+
+def create_product(category, **kwargs):
+    kwargs.setdefault("title", "Телевизор")
+    kwargs.setdefault("price", 1000)
+    kwargs.setdefault("count_available", 10)
+    return Product.objects.create(category=category, image="products/test.jpg", **kwargs)
+
+
+@override_settings(CACHES=TEST_CACHES, DATABASE_READ_ALIAS="replica")
+class ReplicaTests(TransactionTestCase):
+    # Реплика - отдельный файл, в который sync_replica() копирует основную базу.
+    # В TestCase всё читается с основной базы (чтения внутри транзакции),
+    # поэтому здесь TransactionTestCase
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.category = Category.objects.create(title="Телевизоры", slug="tv")
+        self.product = create_product(self.category)
+        sync_replica()
+
+    def test_reads_go_to_replica(self):
+        self.assertEqual(self.router.db_for_read(Product), "replica")
+        self.assertEqual(self.router.db_for_write(Product), "default")
+        self.assertEqual(Product.objects.get(pk=self.product.pk).count_available, 10)
+
+        Product.objects.filter(pk=self.product.pk).update(count_available=3)
+        # Реплика отстаёт до следующей синхронизации
+        self.assertEqual(Product.objects.get(pk=self.product.pk).count_available, 10)
+        sync_replica()
+        self.assertEqual(Product.objects.get(pk=self.product.pk).count_available, 3)
+
+    def test_basket_is_read_from_primary(self):
+        self.assertEqual(self.router.db_for_read(Basket), "default")
+
+    def request(self, pinned=False):
+        request = RequestFactory().get("/")
+        if pinned:
+            request.COOKIES[PIN_COOKIE] = "1"
+        return start_request(request)
+
+    def test_write_pins_reads_to_primary(self):
+        state, token = self.request()
+        self.assertEqual(self.router.db_for_read(Product), "replica")
+        Product.objects.filter(pk=self.product.pk).update(count_available=3)
+        # Своя запись видна в том же запросе
+        self.assertEqual(self.router.db_for_read(Product), "default")
+        self.assertEqual(Product.objects.get(pk=self.product.pk).count_available, 3)
+        response = finish_request(state, token, HttpResponse())
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_pinned_client_reads_own_writes(self):
+        Product.objects.filter(pk=self.product.pk).update(count_available=3)
+
+        # Следующий запрос с cookie читает с основной базы, без неё - с реплики
+        state, token = self.request(pinned=True)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).count_available, 3)
+        response = finish_request(state, token, HttpResponse())
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+        state, token = self.request()
+        self.assertEqual(Product.objects.get(pk=self.product.pk).count_available, 10)
+        finish_request(state, token, HttpResponse())
+
+    def test_reads_in_transaction_go_to_primary(self):
+        with transaction.atomic():
+            self.assertEqual(self.router.db_for_read(Product), "default")
+
+    def test_registry_reloads_from_primary(self):
+        # Другой воркер узнаёт о новой категории по версии в кэше и
+        # перечитывает список с основной базы, даже если реплика отстала
+        registry = CategoryRegistry()
+        self.assertIsNone(registry.get_id("new-zz"))
+
+        category = Category.objects.create(title="Новая", slug="new-zz")
+        registry._checked_at = 0
+        self.assertFalse(Category.objects.filter(slug="new-zz").exists())
+        self.assertEqual(registry.get_id("new-zz"), category.pk)
+        filters = CatalogFilters(QueryDict("category_slug=new-zz"), registry.all())
+        self.assertEqual(filters.category_ids, [category.pk])
+
+
+class CatalogCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(CACHES={
+            "default": {
+                "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                "LOCATION": directory.name,
+            },
+        })
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_lock_is_exclusive(self):
+        self.assertTrue(acquire_lock("page:lock"))
+        self.assertFalse(acquire_lock("page:lock"))
+        release_lock("page:lock")
+        self.assertTrue(acquire_lock("page:lock"))
+
+    def test_stale_lock_is_broken(self):
+        self.assertTrue(acquire_lock("page:lock"))
+        stale = os.path.getmtime(lock_path("page:lock")) - CATALOG_LOCK_TIMEOUT - 1
+        os.utime(lock_path("page:lock"), (stale, stale))
+        self.assertTrue(acquire_lock("page:lock"))
+
+    def test_unknown_sort_is_not_part_of_key(self):
+        view = StoreCatalogView()
+        for query, expected in (("filter_by=price", {"filter_by": "price"}), ("filter_by=junk", {})):
+            view.request = RequestFactory().get(f"/catalog/?{query}")
+            view.filters = CatalogFilters(view.request.GET, [])
+            self.assertEqual(view.get_cache_params(), expected)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class BasketReserveTests(TestCase):
+    def setUp(self):
+        self.user = create_user("buyer")
+        self.product = create_product(Category.objects.create(title="Телевизоры", slug="tv"), count_available=3)
+
+    def test_add_beyond_stock(self):
+        added = [Basket.objects.add_product(self.user, self.product.pk) for _ in range(5)]
+        self.assertEqual(added, [True, True, True, False, False])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.count_available, 0)
+        self.assertEqual(Basket.objects.get(user=self.user, product=self.product).quantity, 3)
+
+    def test_remove_returns_stock(self):
+        Basket.objects.add_product(self.user, self.product.pk)
+        Basket.objects.add_product(self.user, self.product.pk)
+        self.assertTrue(Basket.objects.remove_product(self.user, self.product.pk))
+        self.assertTrue(Basket.objects.remove_product(self.user, self.product.pk))
+        self.assertFalse(Basket.objects.remove_product(self.user, self.product.pk))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.count_available, 3)
+        self.assertFalse(Basket.objects.filter(user=self.user).exists())
+
+    def test_stock_cannot_go_negative(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Product.objects.filter(pk=self.product.pk).update(count_available=F("count_available") - 4)
+
+
+@override_settings(CACHES=TEST_CACHES, DATABASE_READ_ALIAS="default")
+class ConcurrentBasketReserveTests(TransactionTestCase):
+    # Параллельные добавления из разных соединений не продают больше остатка
+    def test_concurrent_add_beyond_stock(self):
+        product = create_product(Category.objects.create(title="Телевизоры", slug="tv"), count_available=5)
+        users = [create_user(f"buyer{i}") for i in range(4)]
+        barrier = threading.Barrier(len(users))
+        results = []
+
+        def add(user):
+            try:
+                barrier.wait()
+                results.extend(Basket.objects.add_product(user, product.pk) for _ in range(3))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=add, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        self.assertEqual(results.count(True), 5)
+        self.assertEqual(product.count_available, 0)
+        self.assertEqual(sum(Basket.objects.values_list("quantity", flat=True)), 5)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CreateOrderTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(title="Телевизоры", slug="tv")
+
+    def fill_basket(self, user, lines):
+        products = [create_product(self.category, price=100 + i) for i in range(lines)]
+        for product in products:
+            Basket.objects.add_product(user, product.pk)
+        return products
+
+    def test_query_count_does_not_depend_on_lines(self):
+        small, large = create_user("small"), create_user("large")
+        self.fill_basket(small, 1)
+        self.fill_basket(large, 40)
+
+        with CaptureQueriesContext(connection) as queries:
+            Order.objects.create_from_basket(small)
+        with self.assertNumQueries(len(queries)):
+            order = Order.objects.create_from_basket(large)
+
+        self.assertEqual(order.items.count(), 40)
+        self.assertEqual(order.items_count, 40)
+        self.assertEqual(order.total_price, sum(100 + i for i in range(40)))
+        self.assertFalse(Basket.objects.filter(user=large).exists())
+
+    def test_failure_leaves_basket_and_stock(self):
+        user = create_user("buyer")
+        products = self.fill_basket(user, 3)
+
+        with mock.patch.object(DailySalesQuerySet, "record", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                Order.objects.create_from_basket(user)
+
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Basket.objects.filter(user=user).count(), 3)
+        self.assertEqual(
+            list(Product.objects.filter(pk__in=[p.pk for p in products]).values_list("count_available", flat=True)),
+            [9, 9, 9],
+        )
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(title="Телевизоры", slug="tv")
+        self.products = [create_product(category, price=100 * (i + 1)) for i in range(3)]
+
+    def place_order(self, username, products):
+        user = create_user(username)
+        for product in products:
+            Basket.objects.add_product(user, product.pk)
+        return Order.objects.create_from_basket(user)
+
+    def snapshot(self):
+        return (
+            list(DailySales.objects.order_by("day").values(
+                "day", "orders_count", "confirmed_count", "cancelled_count", "items_count", "revenue"
+            )),
+            list(DailyProductSales.objects.order_by("day", "product_id").values(
+                "day", "product_id", "quantity", "revenue"
+            )),
+        )
+
+    def test_incremental_rollup_matches_rebuild(self):
+        for attempt in range(2):
+            first = self.place_order(f"first{attempt}", self.products)
+            second = self.place_order(f"second{attempt}", self.products[:2])
+            third = self.place_order(f"third{attempt}", self.products[1:])
+            Order.objects.filter(pk__in=[first.pk, second.pk]).confirm()
+            Order.objects.filter(pk__in=[second.pk, third.pk]).cancel("нет в наличии")
+            # Повторная отмена ничего не меняет
+            Order.objects.filter(pk=third.pk).cancel()
+
+        incremental = self.snapshot()
+        DailySales.objects.rebuild()
+        self.assertEqual(incremental, self.snapshot())
+
+        days, products = incremental
+        self.assertEqual(days[0]["orders_count"], 6)
+        self.assertEqual(days[0]["confirmed_count"], 2)
+        self.assertEqual(days[0]["cancelled_count"], 4)
+        self.assertEqual(days[0]["revenue"], 2 * 600)
+        self.assertEqual([row["quantity"] for row in products], [2, 2, 2])
+
+    def test_cancelled_orders_leave_no_product_rows(self):
+        order = self.place_order("buyer", self.products)
+        Order.objects.filter(pk=order.pk).cancel()
+        self.assertFalse(DailyProductSales.objects.exists())
+        DailySales.objects.rebuild()
+        self.assertFalse(DailyProductSales.objects.exists())
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(title="Телевизоры", slug="tv")
+        # Повторяющиеся значения и NULL проверяют переход по id внутри одного значения
+        years = [2020, None, 2021, 2020, None, 2022, 2020, 2021, None, 2023, 2020]
+        for i, year in enumerate(years):
+            create_product(category, title=f"Товар {i}", price=100 + i % 3, year_of_production=year)
+
+    def expected(self, ordering):
+        name = ordering.lstrip("-")
+        products = list(Product.objects.all())
+        products.sort(
+            key=lambda p: (getattr(p, name) is not None, getattr(p, name), p.pk),
+            reverse=ordering.startswith("-"),
+        )
+        return [product.pk for product in products]
+
+    def test_round_trip(self):
+        for ordering in ("-created_at", "year_of_production", "-year_of_production", "price", "-price"):
+            with self.subTest(ordering=ordering):
+                paginator = KeysetPaginator(Product.objects.all(), ordering, 3)
+                pages, cursor = [], None
+                while True:
+                    page = paginator.get_page(cursor)
+                    pages.append([product.pk for product in page])
+                    if not page.has_next():
+                        break
+                    cursor = page.next_cursor
+                self.assertEqual(sum(pages, []), self.expected(ordering))
+                self.assertFalse(paginator.get_page().has_previous())
+
+                # Назад по previous_cursor - те же страницы в обратном порядке
+                for expected in reversed(pages[:-1]):
+                    page = paginator.get_page(page.previous_cursor)
+                    self.assertEqual([product.pk for product in page], expected)
+                self.assertFalse(page.has_previous())
+
+    def test_invalid_cursor(self):
+        paginator = KeysetPaginator(Product.objects.all(), "price", 3)
+        with self.assertRaises(InvalidCursor):
+            paginator.get_page("не курсор")
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ReleaseExpiredTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(title="Телевизоры", slug="tv")
+        self.products = [create_product(category, count_available=5) for _ in range(2)]
+        self.users = [create_user("first"), create_user("second")]
+        for user in self.users:
+            for product in self.products:
+                Basket.objects.add_product(user, product.pk)
+                Basket.objects.add_product(user, product.pk)
+
+    def test_releases_only_expired_lines(self):
+        now = timezone.now()
+        Basket.objects.filter(user=self.users[0]).update(reserved_until=now - timedelta(minutes=1))
+
+        # Пачки по одной строке: остаток возвращается по мере удаления строк
+        self.assertEqual(Basket.objects.release_expired(batch_size=1, now=now), (1, 2))
+        self.assertEqual(Basket.objects.release_expired(batch_size=1, now=now), (1, 2))
+        self.assertEqual(Basket.objects.release_expired(batch_size=1, now=now), (0, 0))
+
+        self.assertFalse(Basket.objects.filter(user=self.users[0]).exists())
+        self.assertEqual(Basket.objects.filter(user=self.users[1]).count(), 2)
+        for product in self.products:
+            product.refresh_from_db()
+            self.assertEqual(product.count_available, 3)
+
+    def test_extended_lines_are_kept(self):
+        now = timezone.now()
+        Basket.objects.update(reserved_until=now - timedelta(minutes=1))
+        # Добавление продлевает резерв строки
+        Basket.objects.add_product(self.users[1], self.products[0].pk)
+
+        self.assertEqual(Basket.objects.release_expired(now=now), (3, 6))
+        line = Basket.objects.get()
+        self.assertEqual((line.user, line.product, line.quantity), (self.users[1], self.products[0], 3))
+        self.assertGreater(line.reserved_until, now)
+        self.assertEqual(
+            sorted(Product.objects.values_list("count_available", flat=True)),
+            [2, 5],
+        )
+
+
+@override_settings(CACHES=TEST_CACHES)
+class BasketApiTests(TestCase):
+    def setUp(self):
+        self.product = create_product(Category.objects.create(title="Телевизоры", slug="tv"), count_available=5)
+
+    def post(self, items):
+        return self.client.post(reverse("store:basket-api"), json.dumps({"items": items}), content_type="application/json")
+
+    def test_sets_quantities(self):
+        response = self.post([{"product": self.product.pk, "quantity": 3}])
+        self.assertEqual(response.status_code, 200)
+
+    def test_rejects_out_of_range_values(self):
+        for item in (
+            {"product": 10 ** 30, "quantity": 3},
+            {"product": 0, "quantity": 3},
+            {"product": self.product.pk, "quantity": 10 ** 30},
+            {"product": self.product.pk, "quantity": -1},
+        ):
+            with self.subTest(item=item):
+                self.assertEqual(self.post([item]).status_code, 400)
@@ -0,0 +1,38 @@
+import functools
+import random
+import time
+
+from django.db import OperationalError, transaction
+
+
+LOCKED_RETRY_ATTEMPTS = 5
+LOCKED_RETRY_DELAY = 0.05  # первая пауза, дальше удваивается
+LOCKED_RETRY_MAX_DELAY = 1
+
+
+def is_locked_error(exc):
+    message = str(exc).lower()
+    return "database is locked" in message or "database table is locked" in message
+
+
+def retry_on_locked(func):
+    # Повторяет всю транзакцию, если SQLite так и не дал блокировку за
+    # busy_timeout. Паузы растут с джиттером и ограничены по числу и длине
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        delay = LOCKED_RETRY_DELAY
+        for attempt in range(1, LOCKED_RETRY_ATTEMPTS + 1):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as exc:
+                # Внутри внешней транзакции повтор бесполезен: откатывать её будет вызывающий
+                if (
+                    attempt == LOCKED_RETRY_ATTEMPTS
+                    or not is_locked_error(exc)
+                    or transaction.get_connection().in_atomic_block
+                ):
+                    raise
+            time.sleep(delay + random.uniform(0, delay))
+            delay = min(delay * 2, LOCKED_RETRY_MAX_DELAY)
+
+    return wrapper
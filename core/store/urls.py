@@ -8,10 +8,12 @@ urlpatterns = [
     path("", StoreHomepageView.as_view(), name="homepage"),
     path("contacts/", ContactsView.as_view(), name="contacts"),
     path("catalog/", StoreCatalogView.as_view(), name="catalog"),
+    path("catalog/search/", StoreSearchView.as_view(), name="search"),
     path("detail/<int:pk>/", StoreProductDetailView.as_view(), name="detail"),
     path("basket/add/<int:pk>/", StoreBasketAddProductView.as_view(), name="add-basket"),
     path("basket/delete/<int:pk>/", StoreBasketDeleteProductView.as_view(), name="delete-basket"),
     path("basket/", StoreBasketView.as_view(), name="basket"),
+    path("basket/api/", StoreBasketApiView.as_view(), name="basket-api"),
     # Orders (client)
     path("orders/checkout/", CheckoutFormView.as_view(), name="checkout"),
     path("orders/", MyOrdersListView.as_view(), name="orders"),
@@ -19,6 +21,7 @@ urlpatterns = [
     path("admin/dashboard/", StoreAdminDashboardView.as_view(), name="admin-dashboard"),
     # Orders (admin)
     path("admin/orders/", AdminOrdersListView.as_view(), name="admin-orders"),
+    path("admin/orders/export/", AdminOrdersExportView.as_view(), name="admin-orders-export"),
     path("admin/orders/<int:pk>/confirm/", AdminOrderConfirmView.as_view(), name="admin-order-confirm"),
     path("admin/orders/<int:pk>/cancel/", AdminOrderCancelView.as_view(), name="admin-order-cancel"),
     path("admin/add/product/", StoreAdminProductCreateView.as_view(), name="admin-product"),
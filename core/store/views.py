@@ -1,62 +1,150 @@
+import json
+from datetime import timedelta
+
 from django.shortcuts import render, redirect, get_object_or_404
-from django.views.generic import TemplateView, ListView, DetailView, CreateView, RedirectView, FormView
-from django.urls import reverse_lazy
+from django.views.generic import View, TemplateView, ListView, DetailView, CreateView, RedirectView
+from django.urls import reverse_lazy, reverse
+from django.template.loader import render_to_string
+from django.utils.http import urlencode
+from django.utils.safestring import mark_safe
 from django.contrib.auth.mixins import UserPassesTestMixin, LoginRequiredMixin
 from django.contrib.auth import authenticate
-from django.http import JsonResponse, HttpResponseForbidden
-
-from .models import Product, Category, Basket, Order, OrderItem
+from django.db import transaction
+from django.db.models import Sum
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, HttpResponseBadRequest, HttpResponseForbidden, Http404, StreamingHttpResponse
+from django.conf import settings
+from django.utils import timezone
+from django.views.static import serve
+
+from .models import Product, Category, Basket, Order, DailySales, DailyProductSales
 from .forms import ProductCreateForm, CategoryCreateForm
+from .pagination import KeysetPaginator, InvalidCursor
+from .cache import aget_or_build_catalog_page
+from .registry import category_registry
+from .facets import CatalogFilters
+from .search import search_product_ids
+from .basket import GuestBasket
+from .storage import CONTENT_ADDRESSED_NAME_RE
+from .exports import export_queryset, export_orders, stream_chunks, astream_chunks
 
 
+# Главная, каталог, карточка товара и корзина - асинхронные представления:
+# под ASGI они не занимают поток из пула sync_to_async, пока ждут базу и кэш.
+# Шаблон рендерится уже в TemplateResponse, там можно обращаться к request.user
+
 class StoreHomepageView(TemplateView):
     template_name = "index.html"
 
-    def get_context_data(self, **kwargs):
-        ctx = super().get_context_data(**kwargs)
-        ctx["products"] = Product.objects.order_by("-created_at")[:5]
-        return ctx
+    async def get(self, request, *args, **kwargs):
+        ctx = self.get_context_data(**kwargs)
+        ctx["products"] = [product async for product in Product.objects.order_by("-created_at")[:5]]
+        return self.render_to_response(ctx)
 
 
-class StoreCatalogView(ListView):
+class StoreCatalogView(TemplateView):
     queryset = Product.objects.filter(count_available__gt=0)
     template_name = 'catalog.html'
     context_object_name = "products"
-
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.all()
+    paginate_by = 24
+    sort_fields = {
+        'new': '-created_at',
+        'year': '-year_of_production',  # сначала новые года
+        'year_old': 'year_of_production',  # сначала старые года
+        'title': 'title',
+        'title_desc': '-title',
+        'price': 'price',
+        'price_desc': '-price',
+    }
+
+    async def get(self, request, *args, **kwargs):
+        # Кэшируется только список товаров: шапка зависит от пользователя
+        self.filters = CatalogFilters(request.GET, await category_registry.aall())
+        params = self.get_cache_params()
+        listing = await aget_or_build_catalog_page(params, self.render_listing)
+        return self.render_to_response(self.get_context_data(catalog_listing=mark_safe(listing)))
+
+    def get_cache_params(self):
+        # В ключ попадают только известные сортировки: произвольные значения
+        # filter_by плодили бы копии одной и той же страницы
+        params = self.filters.params()
+        sort_by = self.request.GET.get('filter_by', '')
+        if sort_by in self.sort_fields:
+            params['filter_by'] = sort_by
+        if self.request.GET.get('cursor'):
+            params['cursor'] = self.request.GET['cursor']
+        return params
+
+    async def render_listing(self):
+        # Курсорная пагинация: без OFFSET и без COUNT(*)
+        paginator = KeysetPaginator(self.get_queryset(), self.get_ordering(), self.paginate_by)
+        try:
+            page = await paginator.aget_page(self.request.GET.get('cursor'))
+        except InvalidCursor:
+            raise Http404("Неверный курсор страницы")
+        facets = await self.filters.afacet_counts(self.queryset.all())
+        context = self.get_listing_context(page, *facets)
+        return render_to_string('includes/catalog_listing.html', context)
+
+    def get_page_url(self, cursor):
+        params = self.get_cache_params()
+        params['cursor'] = cursor
+        return f"{reverse('store:catalog')}?{urlencode(params, doseq=True)}"
+
+    def get_listing_context(self, page, country_facets, category_facets):
+        # Контекст кэшируемого списка товаров; страницу и фасеты собирает render_listing
+        slugs = self.filters.category_slugs
+        context = {
+            'view': self,
+            'page_obj': page,
+            'is_paginated': page.has_other_pages(),
+            'object_list': page.object_list,
+            self.context_object_name: page.object_list,
+            'categories': self.filters.categories,
+            'filter_by': self.get_cache_params().get('filter_by', ''),
+            'category_slug': slugs[0] if len(slugs) == 1 else '',
+            'filters': self.filters,
+            'filter_query': urlencode(self.filters.params(), doseq=True),
+            'country_facets': country_facets,
+            'category_facets': category_facets,
+        }
+        if page.has_next():
+            context['next_page_url'] = self.get_page_url(page.next_cursor)
+        if page.has_previous():
+            context['previous_page_url'] = self.get_page_url(page.previous_cursor)
         return context
 
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        
+    def get_ordering(self):
         # Получаем параметр сортировки из GET
         sort_by = self.request.GET.get('filter_by', '')
-        category_sort = self.request.GET.get('category_slug', '')
-
-        if sort_by:
-            sort_fields = {
-                'new': '-created_at',
-                'year': '-year_of_production',  # сначала новые года
-                'year_old': 'year_of_production',  # сначала старые года
-                'title': 'title',
-                'title_desc': '-title', 
-                'price': 'price',
-                'price_desc': '-price',
-            }
-            field = sort_fields.get(sort_by, '-created_at')
+        return self.sort_fields.get(sort_by, '-created_at')
 
-            queryset = queryset.order_by(field)
-        
-        if category_sort:
-            print(category_sort)
-            print(queryset)
-            queryset = queryset.filter(category__slug=category_sort)
-            print(queryset)
+    def get_queryset(self):
+        # Категории фильтруются по id из реестра, без соединения с таблицей категорий
+        return self.filters.apply(self.queryset.all())
 
-        return queryset
-        
+
+class StoreSearchView(TemplateView):
+    template_name = 'search.html'
+    paginate_by = 24
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        query = self.request.GET.get('q', '').strip()
+        try:
+            page = max(int(self.request.GET.get('page', 1)), 1)
+        except ValueError:
+            raise Http404("Неверный номер страницы")
+
+        # Берём на одну запись больше, чтобы узнать о следующей странице без COUNT(*)
+        ids = search_product_ids(query, self.paginate_by + 1, (page - 1) * self.paginate_by)
+        products = Product.objects.in_bulk(ids[:self.paginate_by])
+        ctx['query'] = query
+        ctx['page'] = page
+        ctx['products'] = [products[pk] for pk in ids[:self.paginate_by] if pk in products]
+        ctx['has_next'] = len(ids) > self.paginate_by
+        ctx['has_previous'] = page > 1
+        return ctx
 
 
 class StoreProductDetailView(DetailView):
@@ -64,6 +152,13 @@ class StoreProductDetailView(DetailView):
     template_name = 'product_detail.html'
     context_object_name = "product"
 
+    async def get(self, request, *args, **kwargs):
+        try:
+            self.object = await Product.objects.select_related('category').aget(pk=kwargs['pk'])
+        except Product.DoesNotExist:
+            raise Http404("Товар не найден")
+        return self.render_to_response(self.get_context_data(object=self.object))
+
 
 
 class StoreAdminProductCreateView(UserPassesTestMixin, CreateView):
@@ -93,32 +188,63 @@ class StoreAdminCategoryCreateView(UserPassesTestMixin, CreateView):
 class StoreAdminDashboardView(UserPassesTestMixin, TemplateView):
     template_name = "admin/dashboard.html"
     login_url = reverse_lazy('account:login')
+    periods = (7, 30, 90)
 
     def test_func(self):
         return self.request.user.is_superuser or self.request.user.is_staff
 
+    def get_context_data(self, **kwargs):
+        # Всё берётся из сводки по дням (DailySales), поэтому число и цена
+        # запросов не зависят от размера Order и OrderItem
+        ctx = super().get_context_data(**kwargs)
+        days = self.request.GET.get('days', '')
+        days = int(days) if days.isdigit() and int(days) in self.periods else 30
+        since = timezone.localdate() - timedelta(days=days - 1)
+
+        daily = list(DailySales.objects.filter(day__gte=since).order_by('-day'))
+        orders = sum(row.orders_count for row in daily)
+        cancelled = sum(row.cancelled_count for row in daily)
+        product_sales = DailyProductSales.objects.filter(day__gte=since).order_by('-revenue')
+        ctx.update({
+            'days': days,
+            'periods': self.periods,
+            'daily': daily,
+            'max_revenue': max([row.revenue for row in daily], default=0),
+            'totals': {
+                'orders': orders,
+                'confirmed': sum(row.confirmed_count for row in daily),
+                'cancelled': cancelled,
+                'items': sum(row.items_count for row in daily),
+                'revenue': sum(row.revenue for row in daily),
+                'cancellation_rate': cancelled / orders if orders else 0,
+            },
+            'top_products': product_sales.values('product_id', 'product__title').annotate(
+                total_quantity=Sum('quantity'), total_revenue=Sum('revenue'),
+            ).order_by('-total_revenue')[:10],
+            'top_categories': product_sales.values('product__category__title').annotate(
+                total_quantity=Sum('quantity'), total_revenue=Sum('revenue'),
+            ).order_by('-total_revenue')[:10],
+            'low_stock': Product.objects.filter(count_available__lte=settings.LOW_STOCK_THRESHOLD)
+            .only('pk', 'title', 'count_available')
+            .order_by('count_available', 'pk')[:20],
+            'low_stock_threshold': settings.LOW_STOCK_THRESHOLD,
+        })
+        return ctx
+
 
 class StoreBasketAddProductView(RedirectView):
     url = reverse_lazy("store:basket")
 
     def get(self, request, *args, **kwargs):
         product_id = kwargs.get('pk')
-        product = get_object_or_404(Product, id=product_id)
-
-        if product.count_available:
-            # Используем get_or_create для поиска или создания корзины
-            user_basket, created = Basket.objects.get_or_create(
-                product=product,
-                user=request.user,
-            )
-
-            if not created:
-                user_basket.quantity += 1
-                user_basket.save()
-
-            product.count_available -= 1
-            product.save()
 
+        if not request.user.is_authenticated:
+            added = GuestBasket(request.session).add(product_id)
+        else:
+            added = Basket.objects.add_product(request.user, product_id)
+        if not added:
+            # Товара нет в наличии или он не существует
+            get_object_or_404(Product.objects.only("id"), id=product_id)
 
         return super().get(request, *args, **kwargs)
 
@@ -128,20 +254,13 @@ class StoreBasketDeleteProductView(RedirectView):
 
     def get(self, request, *args, **kwargs):
         product_id = kwargs.get('pk')
-        product = get_object_or_404(Product, id=product_id)
 
-        user_basket = get_object_or_404(Basket, product=product, user=request.user, )
-
-        user_basket.quantity -= 1
-
-        if not user_basket.quantity:
-            user_basket.delete()
+        if not request.user.is_authenticated:
+            removed = GuestBasket(request.session).remove(product_id)
         else:
-            user_basket.save()
-
-        product.count_available += 1
-        product.save()
-
+            removed = Basket.objects.remove_product(request.user, product_id)
+        if not removed:
+            raise Http404("Товара нет в корзине")
 
         return super().get(request, *args, **kwargs)
 
@@ -150,9 +269,16 @@ class StoreBasketView(ListView):
     model = Basket
     template_name = "basket.html"
     context_object_name = 'basket_items'
-    
-    def get_queryset(self):
-        return Basket.objects.filter(user=self.request.user).select_related('product')
+
+    async def get(self, request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            self.object_list = await GuestBasket(request.session).aitems()
+        else:
+            self.object_list = [
+                item async for item in Basket.objects.filter(user=user).select_related('product')
+            ]
+        return self.render_to_response(self.get_context_data())
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
@@ -163,6 +289,72 @@ class StoreBasketView(ListView):
     
 
 
+class StoreBasketApiView(View):
+    # POST {"items": [{"product": 1, "quantity": 3}, ...]} задаёт количества
+    # сразу для нескольких товаров; 0 убирает товар из корзины
+    http_method_names = ['post']
+    max_items = 100
+    max_quantity = 1000
+    max_product_id = 2 ** 63 - 1  # больше не помещается в INTEGER SQLite
+
+    def parse_quantities(self, body):
+        try:
+            items = json.loads(body)['items']
+        except (ValueError, KeyError, TypeError):
+            raise ValueError('Ожидается JSON с ключом "items"')
+        if not isinstance(items, list) or not 0 < len(items) <= self.max_items:
+            raise ValueError(f'"items" должен быть списком из 1-{self.max_items} позиций')
+
+        quantities = {}
+        for item in items:
+            product_id = item.get('product') if isinstance(item, dict) else None
+            quantity = item.get('quantity') if isinstance(item, dict) else None
+            if (
+                type(product_id) is not int
+                or type(quantity) is not int
+                or not 1 <= product_id <= self.max_product_id
+                or not 0 <= quantity <= self.max_quantity
+            ):
+                raise ValueError(
+                    f'Каждая позиция - {{"product": id, "quantity": целое от 0 до {self.max_quantity}}}'
+                )
+            quantities[product_id] = quantity
+        return quantities
+
+    def post(self, request, *args, **kwargs):
+        try:
+            quantities = self.parse_quantities(request.body)
+        except ValueError as exc:
+            return JsonResponse({'error': str(exc)}, status=400)
+
+        if request.user.is_authenticated:
+            result, products = Basket.objects.set_quantities(request.user, quantities)
+            basket_items = Basket.objects.filter(user=request.user).select_related('product')
+        else:
+            guest_basket = GuestBasket(request.session)
+            result, products = guest_basket.set_quantities(quantities)
+            basket_items = guest_basket.items()
+
+        lines = [
+            {
+                'product': product_id,
+                'requested': quantities[product_id],
+                'quantity': quantity,
+                'price': products[product_id].price,
+                'total_price': quantity * products[product_id].price,
+                'count_available': products[product_id].count_available,
+            }
+            for product_id, quantity in result.items()
+        ]
+        basket_items = list(basket_items)
+        return JsonResponse({
+            'lines': lines,
+            'missing': [product_id for product_id in quantities if product_id not in products],
+            'total_items': sum(item.quantity for item in basket_items),
+            'total_price': sum(item.get_total_price() for item in basket_items),
+        })
+
+
 class StoreAdminProductDeleteView(UserPassesTestMixin, RedirectView):
     url = reverse_lazy("store:catalog")
     login_url = reverse_lazy('account:login')
@@ -200,22 +392,12 @@ class CheckoutFormView(LoginRequiredMixin, TemplateView):
             context = {"error": "Неверный пароль"}
             return render(request, self.template_name, context, status=400)
 
-        basket_items = Basket.objects.filter(user=request.user)
-        if not basket_items.exists():
+        order = Order.objects.create_from_basket(request.user)
+        if order is None:
             if request.headers.get("x-requested-with") == "XMLHttpRequest":
                 return JsonResponse({"ok": False, "error": "Корзина пуста"}, status=400)
             return redirect("store:basket")
 
-        order = Order.objects.create(user=request.user)
-        for item in basket_items:
-            OrderItem.objects.create(
-                order=order,
-                product=item.product,
-                quantity=item.quantity,
-                price=item.product.price,
-            )
-        basket_items.delete()
-
         if request.headers.get("x-requested-with") == "XMLHttpRequest":
             return JsonResponse({"ok": True, "redirect": str(self.success_url)})
 
@@ -236,8 +418,10 @@ class MyOrderDeleteView(LoginRequiredMixin, RedirectView):
     def post(self, request, *args, **kwargs):
         order = get_object_or_404(Order, pk=kwargs.get("pk"), user=request.user)
         if order.status == Order.Status.NEW:
-            order.restore_stock()
-            order.delete()
+            with transaction.atomic():
+                orders = Order.objects.filter(pk=order.pk, status=Order.Status.NEW)
+                orders.restore_stock()
+                orders.delete_with_sales()
             return super().get(request, *args, **kwargs)
         return HttpResponseForbidden("Нельзя удалить заказ со статусом не 'Новый'")
 
@@ -250,13 +434,43 @@ class AdminOrdersListView(UserPassesTestMixin, ListView):
         return self.request.user.is_superuser or self.request.user.is_staff
 
     def get_queryset(self):
-        qs = Order.objects.select_related("user").prefetch_related("items")
+        qs = Order.objects.select_related("user")
         status = self.request.GET.get("status")
         if status in {s.value for s in Order.Status}:
             qs = qs.filter(status=status)
         return qs.order_by("-created_at")
 
 
+class AdminOrdersExportView(UserPassesTestMixin, View):
+    # Выгрузка заказов с позициями для бухгалтерии: ?format=csv|jsonl&status=&date_from=&date_to=
+    http_method_names = ['get']
+    content_types = {
+        'csv': 'text/csv; charset=utf-8',
+        'jsonl': 'application/x-ndjson; charset=utf-8',
+    }
+
+    def test_func(self):
+        return self.request.user.is_superuser or self.request.user.is_staff
+
+    def get(self, request, *args, **kwargs):
+        fmt = request.GET.get('format', 'csv')
+        if fmt not in self.content_types:
+            return HttpResponseBadRequest('format: csv или jsonl')
+        try:
+            orders = export_queryset(
+                request.GET.get('status'), request.GET.get('date_from'), request.GET.get('date_to')
+            )
+        except ValueError as exc:
+            return HttpResponseBadRequest(str(exc))
+
+        lines = export_orders(orders, fmt)
+        chunks = astream_chunks(lines) if isinstance(request, ASGIRequest) else stream_chunks(lines)
+        response = StreamingHttpResponse(chunks, content_type=self.content_types[fmt])
+        filename = f'orders-{timezone.now():%Y%m%d-%H%M}.{fmt}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
 class AdminOrderConfirmView(UserPassesTestMixin, RedirectView):
     url = reverse_lazy("store:admin-orders")
 
@@ -264,10 +478,10 @@ class AdminOrderConfirmView(UserPassesTestMixin, RedirectView):
         return self.request.user.is_superuser or self.request.user.is_staff
 
     def post(self, request, *args, **kwargs):
-        order = get_object_or_404(Order, pk=kwargs.get("pk"))
-        order.status = Order.Status.CONFIRMED
-        order.cancelled_reason = ""
-        order.save()
+        orders = Order.objects.filter(pk=kwargs.get("pk"))
+        if not orders.exists():
+            raise Http404("Заказ не найден")
+        orders.confirm()
         return super().get(request, *args, **kwargs)
 
 
@@ -284,11 +498,16 @@ class AdminOrderCancelView(UserPassesTestMixin, TemplateView):
         return ctx
 
     def post(self, request, *args, **kwargs):
-        order = get_object_or_404(Order, pk=kwargs.get("pk"))
+        orders = Order.objects.filter(pk=kwargs.get("pk"))
         reason = request.POST.get("reason", "").strip()
-        if order.status != Order.Status.CANCELLED:
-            order.restore_stock()
-        order.status = Order.Status.CANCELLED
-        order.cancelled_reason = reason[:255]
-        order.save()
+        if not orders.cancel(reason):
+            raise Http404("Заказ не найден")
         return redirect(self.success_url)
+
+
+def serve_media(request, path):
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    # Имя файла задаёт его содержимое, поэтому браузер может не перепроверять его
+    if response.status_code == 200 and CONTENT_ADDRESSED_NAME_RE.search(path):
+        response["Cache-Control"] = f"public, max-age={settings.MEDIA_IMMUTABLE_MAX_AGE}, immutable"
+    return response
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core.sessions import CLEANUP_BATCH_SIZE, delete_expired_rows, purge_expired_cache_files
+
+
+class Command(BaseCommand):
+    help = "Удаляет просроченные сессии из кэша сессий и пачками из таблицы django_session"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=CLEANUP_BATCH_SIZE)
+        parser.add_argument("--pause", type=float, default=0, help="пауза между пачками, сек")
+
+    def handle(self, *args, **options):
+        # Строки в базе чистим всегда: могли остаться от db-сессий или от fallback
+        rows = delete_expired_rows(options["batch_size"], options["pause"])
+        files = purge_expired_cache_files()
+        self.stdout.write(self.style.SUCCESS(f"Удалено строк: {rows}, файлов кэша: {files}"))